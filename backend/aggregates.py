@@ -0,0 +1,58 @@
+"""Running per-session metric aggregates, updated in O(1) as each turn is recorded"""
+
+# Weight of the newest point in the exponentially weighted trend
+EWMA_ALPHA = 0.3
+
+
+def empty_aggregate():
+    return {
+        'count': 0,
+        'sum': {},
+        'min': {},
+        'max': {},
+        'ewma': {},
+        'latest': {},
+        'latest_turn': -1
+    }
+
+def update_aggregate(aggregate, turn, metrics, alpha=EWMA_ALPHA):
+    """Fold one turn's metrics into the aggregate in place"""
+    aggregate['count'] += 1
+    for key, value in metrics.items():
+        if not isinstance(value, (int, float)):
+            continue
+        aggregate['sum'][key] = aggregate['sum'].get(key, 0) + value
+        aggregate['min'][key] = min(aggregate['min'].get(key, value), value)
+        aggregate['max'][key] = max(aggregate['max'].get(key, value), value)
+        previous = aggregate['ewma'].get(key)
+        aggregate['ewma'][key] = value if previous is None else alpha * value + (1 - alpha) * previous
+
+    # Deferred metrics can land out of order; "latest" follows the turn number
+    if turn >= aggregate['latest_turn']:
+        aggregate['latest'] = metrics
+        aggregate['latest_turn'] = turn
+    return aggregate
+
+def summarize(aggregate):
+    count = aggregate['count']
+    return {
+        'count': count,
+        'latest': aggregate['latest'],
+        'average': {key: total / count for key, total in aggregate['sum'].items()} if count else {},
+        'min': aggregate['min'],
+        'max': aggregate['max'],
+        'trend': aggregate['ewma']
+    }
+
+def window(history, since=None, limit=None):
+    """Select points recorded after sequence number `since` (in arrival order), or the newest
+    `limit` points by turn.
+
+    Paging on `seq` rather than the turn keeps late deferred metrics from being skipped.
+    """
+    if since is not None:
+        points = sorted((m for m in history if m['seq'] > since), key=lambda m: m['seq'])
+        return points[:limit] if limit is not None else points
+    if limit is not None:
+        return history[-limit:] if limit else []
+    return list(history)
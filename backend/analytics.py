@@ -0,0 +1,137 @@
+"""Vectorised cohort analytics over the metrics log.
+
+All functions take the structured array from metrics_log.load_rows() and work on whole
+columns; sessions are grouped with np.unique/np.bincount rather than Python loops.
+"""
+import time
+
+import numpy as np
+
+from structured import METRIC_KEYS
+
+# Higher is worse for every metric except motivation
+RISK_SIGN = np.array([-1.0 if key == "motivation" else 1.0 for key in METRIC_KEYS], dtype=np.float32)
+PERCENTILES = (50, 75, 90, 95, 99)
+DAY = 24 * 3600
+
+
+def select(rows, since=None, include_fallbacks=False):
+    """Rows newer than `since` (epoch seconds), without default-metrics fallbacks by default"""
+    mask = np.ones(len(rows), dtype=bool)
+    if since is not None:
+        mask &= rows["timestamp"] >= since
+    if not include_fallbacks:
+        mask &= rows["fallback"] == 0
+    return rows[mask]
+
+def percentiles(rows, qs=PERCENTILES):
+    """Per-metric percentiles and mean over all selected turns"""
+    if not len(rows):
+        return {}
+    values = np.asarray(rows["metrics"], dtype=np.float64)
+    table = np.nanpercentile(values, qs, axis=0)
+    means = np.nanmean(values, axis=0)
+    return {
+        key: {"mean": float(means[i]), **{f"p{q}": float(table[j, i]) for j, q in enumerate(qs)}}
+        for i, key in enumerate(METRIC_KEYS)
+    }
+
+def daily_distribution(rows, metric, days=7, now=None, qs=(50, 90)):
+    """Per-day count, mean and percentiles of one metric over the last `days` days"""
+    column = METRIC_KEYS.index(metric)
+    now = time.time() if now is None else now
+    start = now - days * DAY
+    recent = rows[rows["timestamp"] >= start]
+    day_index = ((recent["timestamp"] - start) // DAY).astype(np.int64)
+    values = np.asarray(recent["metrics"][:, column], dtype=np.float64)
+
+    result = []
+    for day in range(days):
+        day_values = values[day_index == day]
+        entry = {"day_start": start + day * DAY, "count": int(len(day_values))}
+        if len(day_values):
+            entry["mean"] = float(day_values.mean())
+            entry.update({f"p{q}": float(v) for q, v in zip(qs, np.percentile(day_values, qs))})
+        result.append(entry)
+    return result
+
+def session_groups(rows):
+    """Sort rows by (session, turn) and return the sorted rows, unique sessions and group ids"""
+    order = np.lexsort((rows["turn"], rows["session"]))
+    ordered = rows[order]
+    sessions, groups = np.unique(ordered["session"], return_inverse=True)
+    return ordered, sessions, groups
+
+def session_trends(rows, min_turns=3):
+    """Least-squares slope per session and metric (change per turn), plus turn counts and latest values.
+
+    Computed from per-session sums via bincount, so the cost is linear in the number of rows.
+    """
+    ordered, sessions, groups = session_groups(rows)
+    count = np.bincount(groups, minlength=len(sessions)).astype(np.float64)
+    x = ordered["turn"].astype(np.float64)
+    y = np.asarray(ordered["metrics"], dtype=np.float64)
+
+    sum_x = np.bincount(groups, x, len(sessions))
+    sum_xx = np.bincount(groups, x * x, len(sessions))
+    sum_y = np.stack([np.bincount(groups, y[:, i], len(sessions)) for i in range(y.shape[1])], axis=1)
+    sum_xy = np.stack([np.bincount(groups, x * y[:, i], len(sessions)) for i in range(y.shape[1])], axis=1)
+
+    denominator = count * sum_xx - sum_x * sum_x
+    with np.errstate(invalid="ignore", divide="ignore"):
+        slopes = (count[:, None] * sum_xy - sum_x[:, None] * sum_y) / denominator[:, None]
+    valid = (count >= min_turns) & (denominator > 0)
+    slopes[~valid] = np.nan
+
+    # Rows are sorted by turn within each session, so the last row of each group is the latest
+    last = np.r_[np.flatnonzero(np.diff(groups)), len(groups) - 1] if len(groups) else np.array([], dtype=int)
+    latest = y[last] if len(last) else np.empty((0, y.shape[1]))
+    return sessions, count.astype(np.int64), slopes, latest
+
+def top_trending(sessions, counts, slopes, metric, k=10):
+    """Sessions whose `metric` is rising fastest"""
+    column = slopes[:, METRIC_KEYS.index(metric)]
+    candidates = np.flatnonzero(np.nan_to_num(column, nan=-np.inf) > 0)
+    best = candidates[np.argsort(-column[candidates], kind="stable")[:k]]
+    return [
+        {"session": int(sessions[i]), "turns": int(counts[i]), "slope": float(column[i])}
+        for i in best
+    ]
+
+def top_at_risk(sessions, counts, slopes, latest, k=10, trend_weight=2.0):
+    """Rank sessions by a composite of their latest metrics plus how fast they are worsening.
+
+    Motivation is inverted so every term points the same way. Returns the top `k`.
+    """
+    if not len(sessions):
+        return []
+    level = np.where(RISK_SIGN > 0, latest, 10 - latest).mean(axis=1)
+    worsening = np.nan_to_num(slopes * RISK_SIGN, nan=0.0).mean(axis=1)
+    score = level + trend_weight * np.clip(worsening, 0, None)
+    k = min(k, len(score))
+    best = np.argpartition(-score, k - 1)[:k]
+    best = best[np.argsort(-score[best], kind="stable")]
+    return [
+        {
+            "session": int(sessions[i]),
+            "turns": int(counts[i]),
+            "score": float(score[i]),
+            "latest": {key: float(latest[i, j]) for j, key in enumerate(METRIC_KEYS)}
+        }
+        for i in best
+    ]
+
+def cohort_report(rows, since=None, metric="anxiety", k=10, min_turns=3, days=7, now=None):
+    """Everything the counselor dashboard needs in one pass over the log"""
+    start = time.perf_counter()
+    selected = select(rows, since)
+    sessions, counts, slopes, latest = session_trends(selected, min_turns)
+    return {
+        "rows": int(len(selected)),
+        "sessions": int(len(sessions)),
+        "percentiles": percentiles(selected),
+        "daily": daily_distribution(selected, metric, days, now),
+        "trending_up": top_trending(sessions, counts, slopes, metric, k),
+        "at_risk": top_at_risk(sessions, counts, slopes, latest, k),
+        "seconds": round(time.perf_counter() - start, 4)
+    }
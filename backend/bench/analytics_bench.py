@@ -0,0 +1,75 @@
+"""Time cohort analytics over a synthetic metrics log.
+
+Run from the backend directory:
+    python -m bench.analytics_bench --rows 1000000 --sessions 50000
+"""
+import argparse
+import shutil
+import tempfile
+import time
+
+import numpy as np
+
+import analytics
+from bench.results import write_results
+from metrics_log import ROW_DTYPE, load_rows
+from structured import METRIC_KEYS
+
+
+def write_synthetic_log(directory, rows, sessions, segments, seed=0):
+    """Random sessions with a per-session drift, split across `segments` files like several workers"""
+    rng = np.random.default_rng(seed)
+    now = time.time()
+    data = np.empty(rows, dtype=ROW_DTYPE)
+    session = rng.integers(0, sessions, rows)
+    drift = rng.normal(0, 0.3, (sessions, len(METRIC_KEYS)))
+    data["session"] = session.astype(np.uint64) + 1
+    data["turn"] = rng.integers(0, 40, rows)
+    data["timestamp"] = now - rng.uniform(0, 14 * analytics.DAY, rows)
+    data["fallback"] = rng.random(rows) < 0.02
+    base = rng.uniform(2, 8, (sessions, len(METRIC_KEYS)))
+    values = base[session] + drift[session] * data["turn"][:, None] + rng.normal(0, 1, (rows, len(METRIC_KEYS)))
+    data["metrics"] = np.clip(np.round(values), 0, 10)
+
+    for i, chunk in enumerate(np.array_split(data, segments)):
+        np.save(f"{directory}/segment-{i}-{i}-{i:06d}.npy", chunk)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--sessions", type=int, default=50_000)
+    parser.add_argument("--segments", type=int, default=64)
+    parser.add_argument("--output", default=None)
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp(prefix="mindly_metrics_")
+    try:
+        write_synthetic_log(directory, args.rows, args.sessions, args.segments)
+
+        start = time.perf_counter()
+        rows = load_rows(directory)
+        loaded = time.perf_counter()
+        report = analytics.cohort_report(rows, since=time.time() - 7 * analytics.DAY)
+        done = time.perf_counter()
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+    results = {
+        "rows": args.rows,
+        "sessions": args.sessions,
+        "segments": args.segments,
+        "load_seconds": loaded - start,
+        "report_seconds": done - loaded,
+        "rows_in_window": report["rows"],
+        "sessions_in_window": report["sessions"]
+    }
+    print(
+        f"{args.rows} rows / {args.sessions} sessions: load {results['load_seconds']:.3f}s, "
+        f"report {results['report_seconds']:.3f}s ({report['rows']} rows in the last 7 days)"
+    )
+    write_results("analytics", results, args.output)
+
+
+if __name__ == "__main__":
+    main()
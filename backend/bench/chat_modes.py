@@ -0,0 +1,65 @@
+"""Compare /api/chat latency across CHAT_MODE settings (and GENERATION_MODE=combined) using the fake model.
+
+Run from the backend directory:
+    python -m bench.chat_modes --turns 10 --latency 0.5
+"""
+import argparse
+import os
+import statistics
+import time
+
+os.environ.setdefault("MODEL_BACKEND", "fake")
+os.environ.setdefault("BACKGROUND_WARMUP", "0")
+
+import script
+
+
+def run_mode(app, mode, turns, generation="split"):
+    script.CHAT_MODE = mode
+    script.GENERATION_MODE = generation
+    client = app.test_client()
+    session_id = f"bench_{mode}_{time.time()}"
+    timings = []
+
+    for i in range(turns):
+        start = time.perf_counter()
+        res = client.post('/api/chat', json={
+            # Distinct per run so one run's cached metrics do not flatter the next
+            'message': f"I'm stressed about exams ({mode}, {generation}, {i})",
+            'session_id': session_id
+        })
+        timings.append(time.perf_counter() - start)
+        assert res.status_code == 200, res.get_data(as_text=True)
+
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--turns", type=int, default=10)
+    parser.add_argument("--latency", type=float, default=0.5)
+    args = parser.parse_args()
+
+    app = script.create_app()
+    script.model.latency = args.latency
+
+    print(f"Fake model latency: {args.latency:.2f}s per call, {args.turns} turns per mode")
+    for mode in ("sequential", "parallel", "deferred"):
+        timings = run_mode(app, mode, args.turns)
+        print(
+            f"{mode:<11} p50={statistics.median(timings) * 1000:7.1f}ms "
+            f"max={max(timings) * 1000:7.1f}ms"
+        )
+
+    calls_before = script.model.calls
+    timings = run_mode(app, "parallel", args.turns, generation="combined")
+    print(
+        f"{'combined':<11} p50={statistics.median(timings) * 1000:7.1f}ms "
+        f"max={max(timings) * 1000:7.1f}ms model_calls={script.model.calls - calls_before}"
+    )
+
+    script.shutdown_resources()
+
+
+if __name__ == "__main__":
+    main()
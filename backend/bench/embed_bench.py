@@ -0,0 +1,107 @@
+"""Embeddings per second on CPU: one text per forward pass (the old path) vs the embedding
+service's micro-batched queries, batched documents and on-disk cache.
+
+Run from the backend directory:
+    python -m bench.embed_bench --texts 512 --concurrency 16
+    python -m bench.embed_bench --quantize int8
+    python -m bench.embed_bench --fake-pass-ms 8 --fake-text-ms 0.5   # offline, no model download
+"""
+import argparse
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from bench.kb_bench import QUERIES
+from bench.results import write_results
+from embeddings import EmbeddingCache, EmbeddingService
+
+
+def fake_encoder(pass_ms, text_ms, dim=384):
+    """Stand-in with a fixed cost per forward pass plus a cost per text, like a CPU transformer"""
+    def encode(texts):
+        time.sleep((pass_ms + text_ms * len(texts)) / 1000)
+        rng = np.random.default_rng(abs(hash(tuple(texts))) % 2 ** 32)
+        return rng.normal(size=(len(texts), dim)).astype(np.float32)
+    return encode
+
+
+def rate(count, seconds):
+    return count / seconds if seconds else float("inf")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--texts", type=int, default=512)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--max-wait-ms", type=float, default=5)
+    parser.add_argument("--quantize", choices=["float16", "int8"], default=None)
+    parser.add_argument("--fake-pass-ms", type=float, default=None)
+    parser.add_argument("--fake-text-ms", type=float, default=0.5)
+    parser.add_argument("--output", default=None)
+    args = parser.parse_args()
+
+    encode = None
+    if args.fake_pass_ms is not None:
+        encode = fake_encoder(args.fake_pass_ms, args.fake_text_ms)
+    # Unique texts so nothing is served from the cache until the warm run
+    texts = [f"{QUERIES[i % len(QUERIES)]} ({i})" for i in range(args.texts)]
+
+    with tempfile.TemporaryDirectory(prefix="mindly_embed_") as directory:
+        cache = EmbeddingCache(os.path.join(directory, "embeddings.db"), args.quantize)
+        service = EmbeddingService(
+            cache=cache, batch_size=args.batch_size, max_wait_ms=args.max_wait_ms, encode=encode
+        )
+        service.encode(["warm up"])
+
+        start = time.perf_counter()
+        for text in texts:
+            service.encode([text])
+        single = time.perf_counter() - start
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(args.concurrency) as pool:
+            list(pool.map(service.embed_query, texts))
+        queued = time.perf_counter() - start
+        query_stats = service.stats()
+
+        documents = [f"{text} [doc]" for text in texts]
+        start = time.perf_counter()
+        service.embed(documents)
+        batched = time.perf_counter() - start
+
+        start = time.perf_counter()
+        service.embed(documents)
+        cached = time.perf_counter() - start
+        # Fold the write-ahead log back in so the file size reflects the stored vectors
+        cache._conn().execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        cache_bytes = os.path.getsize(cache.path)
+
+    results = {
+        "texts": args.texts,
+        "quantize": args.quantize or "float32",
+        "fake_encoder": encode is not None,
+        "single_per_second": rate(args.texts, single),
+        "microbatched_queries_per_second": rate(args.texts, queued),
+        "avg_query_batch": query_stats["avg_query_batch"],
+        "batched_documents_per_second": rate(args.texts, batched),
+        "cached_per_second": rate(args.texts, cached),
+        "cache_bytes": cache_bytes
+    }
+    print(f"{'path':<34} {'emb/s':>10}")
+    print(f"{'one text per forward pass':<34} {results['single_per_second']:10.1f}")
+    print(
+        f"{f'micro-batched queries (x{args.concurrency})':<34} "
+        f"{results['microbatched_queries_per_second']:10.1f}  avg batch {results['avg_query_batch']:.1f}"
+    )
+    print(f"{'batched documents':<34} {results['batched_documents_per_second']:10.1f}")
+    print(f"{'cache hits':<34} {results['cached_per_second']:10.1f}")
+    print(f"disk cache: {cache_bytes / 1024:.0f} KiB for {args.texts} document vectors ({results['quantize']})")
+    write_results("embeddings", results, args.output)
+
+
+if __name__ == "__main__":
+    main()
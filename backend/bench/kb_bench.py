@@ -0,0 +1,103 @@
+"""Knowledge base query and ingestion micro-benchmarks.
+
+Run from the backend directory:
+    python -m bench.kb_bench --pdf knowledge.pdf --queries 50 --batch 16
+"""
+import argparse
+import os
+import time
+
+from bench.results import summarize, write_results
+from chunking import MinHashDeduplicator
+from kb import MentalHealthKnowledgeBase
+from pdf_loader import chunk_pdf, store_chunks
+
+QUERIES = [
+    "I can't sleep before exams",
+    "How do I stop procrastinating?",
+    "I feel lonely since moving away for university",
+    "Money worries are affecting my studies",
+    "I get panic attacks in lectures",
+    "How can I stay motivated to study?",
+    "I'm overwhelmed by assignments",
+    "Breathing exercises for anxiety",
+]
+
+
+def timed(fn, repeat):
+    samples = []
+    for i in range(repeat):
+        start = time.perf_counter()
+        fn(i)
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def bench_queries(kb, repeat, batch):
+    queries = [QUERIES[i % len(QUERIES)] for i in range(batch)]
+    results = {
+        "query_knowledge": summarize(timed(lambda i: kb.query_knowledge(QUERIES[i % len(QUERIES)]), repeat)),
+        "embed_query": summarize(timed(lambda i: kb.embed_query(QUERIES[i % len(QUERIES)]), repeat)),
+    }
+    embedding = kb.embed_query(QUERIES[0])
+    results["query_by_embedding"] = summarize(timed(lambda i: kb.query_by_embedding(embedding), repeat))
+
+    batch_samples = timed(lambda i: kb.query_batch(queries), max(1, repeat // batch))
+    results["query_batch"] = summarize(batch_samples)
+    results["query_batch"]["batch_size"] = batch
+    results["query_batch"]["per_query_ms"] = results["query_batch"]["mean_ms"] / batch
+    return results
+
+
+def bench_ingestion(kb, pdf_path, batch_size):
+    start = time.perf_counter()
+    chunked = chunk_pdf(pdf_path, category="bench", source="bench")
+    extract_seconds = time.perf_counter() - start
+
+    deduplicator = MinHashDeduplicator()
+    start = time.perf_counter()
+    stored = store_chunks(kb, chunked, batch_size=batch_size, deduplicator=deduplicator)
+    store_seconds = time.perf_counter() - start
+
+    return {
+        "pdf": pdf_path,
+        "pages": chunked["pages"],
+        "chunks": len(chunked["ids"]),
+        "stored": stored,
+        "extract_seconds": extract_seconds,
+        "pages_per_sec": chunked["pages"] / extract_seconds if extract_seconds else None,
+        "store_seconds": store_seconds,
+        "chunks_per_sec": stored / store_seconds if store_seconds else None,
+        "batch_size": batch_size,
+        "dedup": deduplicator.report()
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pdf", default="knowledge.pdf")
+    parser.add_argument("--queries", type=int, default=50, help="repetitions per query benchmark")
+    parser.add_argument("--batch", type=int, default=16, help="queries per query_batch call")
+    parser.add_argument("--batch-size", type=int, default=64, help="chunks embedded per batch")
+    parser.add_argument("--output", default=None)
+    args = parser.parse_args()
+
+    # Ephemeral store and no embedding cache, so queries and ingestion always run the model
+    os.environ["EMBEDDING_CACHE_PATH"] = ""
+    kb = MentalHealthKnowledgeBase(persist_directory=None)
+    results = {
+        "startup": kb.startup_stats,
+        "queries": bench_queries(kb, args.queries, args.batch),
+        "ingestion": bench_ingestion(kb, args.pdf, args.batch_size)
+    }
+
+    for name, s in results["queries"].items():
+        print(f"{name:<20} p50={s['p50_ms']:7.2f}ms p95={s['p95_ms']:7.2f}ms")
+    ingestion = results["ingestion"]
+    print(f"ingestion: {ingestion['pages_per_sec']:.1f} pages/sec extract, "
+          f"{ingestion['chunks_per_sec']:.1f} chunks/sec embed+store")
+    write_results("kb", results, args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,39 @@
+"""Show knowledge base cold start vs warm start with a persistent store.
+
+Run from the backend directory:
+    python -m bench.kb_startup [--persist-dir /tmp/mindly_kb]
+"""
+import argparse
+import os
+import shutil
+import tempfile
+
+from kb import MentalHealthKnowledgeBase
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--persist-dir", default=None)
+    args = parser.parse_args()
+
+    # Without this the shared embedding cache would turn the cold runs into cache reads
+    os.environ["EMBEDDING_CACHE_PATH"] = ""
+    persist_dir = args.persist_dir or tempfile.mkdtemp(prefix="mindly_kb_")
+    try:
+        ephemeral = MentalHealthKnowledgeBase(persist_directory=None).startup_stats
+        cold = MentalHealthKnowledgeBase(persist_directory=persist_dir).startup_stats
+        warm = MentalHealthKnowledgeBase(persist_directory=persist_dir).startup_stats
+    finally:
+        if args.persist_dir is None:
+            shutil.rmtree(persist_dir, ignore_errors=True)
+
+    print(f"\n{'run':<10} {'mode':<6} {'embedded':>8} {'cached':>8} {'seconds':>8}")
+    for name, stats in (("ephemeral", ephemeral), ("first", cold), ("second", warm)):
+        print(
+            f"{name:<10} {stats['mode']:<6} {stats['embedded']:>8} {stats['cache_hits']:>8} "
+            f"{stats['seconds']:>8}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,199 @@
+"""Concurrent load generator for the chat, metrics and questionnaire endpoints.
+
+Runs in-process against the fake model by default, or against a live server with --url.
+Run from the backend directory:
+    python -m bench.load --concurrency 16 --requests 400 --latency 0.5 --failure-rate 0.02
+    python -m bench.load --url http://localhost:5000 --endpoints chat,metrics
+"""
+import argparse
+import os
+import threading
+import time
+
+from bench.results import summarize, write_results
+
+ENDPOINTS = ["chat", "chat_stream", "metrics", "questionnaire_save", "questionnaire_get"]
+
+QUESTIONNAIRE = {
+    "phq1": 2, "phq2": 2, "phq3": 1, "ghq1": 2, "ghq2": 3, "ghq3": 2,
+    "pss1": 2, "pss2": 1, "pss3": 2, "ucla1": 1, "ucla2": 3, "ucla3": 1,
+    "fin1": 3, "fin2": 2, "fin3": 1, "acad1": 2, "acad2": 2, "acad3": 3,
+}
+
+
+class InProcessTarget:
+    def __init__(self):
+        import script
+        self.app = script.create_app()
+        self.model = script.model
+
+    def client(self):
+        return InProcessClient(self.app.test_client())
+
+
+class InProcessClient:
+    def __init__(self, client):
+        self.client = client
+
+    def request(self, method, path, json=None):
+        response = self.client.open(path, method=method, json=json)
+        return response.status_code, response.get_json(silent=True)
+
+    def stream(self, path, json):
+        start = time.perf_counter()
+        response = self.client.post(path, json=json, buffered=False)
+        first = None
+        for _ in response.response:
+            if first is None:
+                first = time.perf_counter() - start
+        response.close()
+        return response.status_code, first
+
+
+class HttpTarget:
+    def __init__(self, url):
+        self.url = url.rstrip("/")
+        self.model = None
+
+    def client(self):
+        import requests
+        return HttpClient(self.url, requests.Session())
+
+
+class HttpClient:
+    def __init__(self, url, session):
+        self.url = url
+        self.session = session
+
+    def request(self, method, path, json=None):
+        response = self.session.request(method, self.url + path, json=json, timeout=120)
+        is_json = response.headers.get("content-type", "").startswith("application/json")
+        return response.status_code, response.json() if is_json else None
+
+    def stream(self, path, json):
+        start = time.perf_counter()
+        first = None
+        with self.session.post(self.url + path, json=json, stream=True, timeout=120) as response:
+            for _ in response.iter_content(chunk_size=None):
+                if first is None:
+                    first = time.perf_counter() - start
+            return response.status_code, first
+
+
+def call(client, endpoint, session_id, user_id, turn):
+    """Run one request; returns (ok, time to first byte or None)"""
+    message = {"message": f"I'm stressed about exams, day {turn}", "session_id": session_id,
+               "user_id": user_id}
+    if endpoint == "chat":
+        status, body = client.request("POST", "/api/chat", message)
+        # Model failures come back as a 200 with an "[Error]" reply
+        return status == 200 and not (body or {}).get("response", "").startswith("[Error]"), None
+    if endpoint == "chat_stream":
+        status, first = client.stream("/api/chat/stream", message)
+        return status == 200, first
+    if endpoint == "metrics":
+        return client.request("GET", f"/api/metrics/{session_id}?limit=10")[0] == 200, None
+    if endpoint == "questionnaire_save":
+        payload = {"userId": user_id, "timestamp": str(time.time()), "responses": QUESTIONNAIRE}
+        return client.request("POST", "/api/questionnaire/latest", payload)[0] == 200, None
+    if endpoint == "questionnaire_get":
+        return client.request("GET", f"/api/questionnaire/latest?userId={user_id}")[0] == 200, None
+    raise ValueError(f"Unknown endpoint: {endpoint}")
+
+
+def run(target, endpoints, concurrency, total_requests):
+    samples = {endpoint: [] for endpoint in endpoints}
+    first_bytes = {endpoint: [] for endpoint in endpoints}
+    errors = {endpoint: 0 for endpoint in endpoints}
+    lock = threading.Lock()
+    counter = iter(range(total_requests))
+
+    def worker(index):
+        client = target.client()
+        session_id = f"load_{index}_{time.time()}"
+        user_id = f"load_user_{index}"
+        # Seed data so read endpoints have something to return; not measured
+        call(client, "questionnaire_save", session_id, user_id, 0)
+        call(client, "chat", session_id, user_id, 0)
+
+        while True:
+            with lock:
+                n = next(counter, None)
+            if n is None:
+                return
+            endpoint = endpoints[n % len(endpoints)]
+            start = time.perf_counter()
+            try:
+                ok, first = call(client, endpoint, session_id, user_id, n)
+            except Exception:
+                ok, first = False, None
+            elapsed = time.perf_counter() - start
+            with lock:
+                samples[endpoint].append(elapsed)
+                if first is not None:
+                    first_bytes[endpoint].append(first)
+                if not ok:
+                    errors[endpoint] += 1
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(concurrency)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - start
+
+    results = {"concurrency": concurrency, "requests": total_requests, "wall_seconds": wall,
+               "endpoints": {}}
+    for endpoint in endpoints:
+        summary = summarize(samples[endpoint])
+        summary["errors"] = errors[endpoint]
+        summary["throughput_rps"] = len(samples[endpoint]) / wall if wall else 0
+        if first_bytes[endpoint]:
+            summary["first_byte"] = summarize(first_bytes[endpoint])
+        results["endpoints"][endpoint] = summary
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default=None, help="live server; default runs in-process")
+    parser.add_argument("--endpoints", default=",".join(ENDPOINTS))
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.5, help="fake model seconds per call")
+    parser.add_argument("--jitter", type=float, default=0.1)
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    parser.add_argument("--output", default=None)
+    args = parser.parse_args()
+
+    endpoints = [e.strip() for e in args.endpoints.split(",") if e.strip()]
+    unknown = set(endpoints) - set(ENDPOINTS)
+    if unknown:
+        parser.error(f"unknown endpoints: {', '.join(sorted(unknown))}")
+
+    if args.url:
+        target = HttpTarget(args.url)
+    else:
+        os.environ.setdefault("MODEL_BACKEND", "fake")
+        os.environ.setdefault("FAKE_MODEL_LATENCY", str(args.latency))
+        os.environ.setdefault("FAKE_MODEL_JITTER", str(args.jitter))
+        os.environ.setdefault("FAKE_MODEL_FAILURE_RATE", str(args.failure_rate))
+        # Measure steady state: finish warm-up (knowledge base included) before the first request
+        os.environ.setdefault("BACKGROUND_WARMUP", "0")
+        target = InProcessTarget()
+
+    results = run(target, endpoints, args.concurrency, args.requests)
+    results["target"] = args.url or "in-process"
+
+    print(f"\n{'endpoint':<20} {'n':>5} {'err':>4} {'rps':>7} {'p50':>8} {'p95':>8} {'p99':>8}")
+    for endpoint, s in results["endpoints"].items():
+        if not s["count"]:
+            continue
+        print(f"{endpoint:<20} {s['count']:>5} {s['errors']:>4} {s['throughput_rps']:>7.1f} "
+              f"{s['p50_ms']:>7.1f}ms {s['p95_ms']:>7.1f}ms {s['p99_ms']:>7.1f}ms")
+    write_results("load", results, args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""Shared helpers for benchmark scripts: latency summaries and machine-readable output"""
+import json
+import os
+import platform
+import subprocess
+import time
+
+RESULTS_DIR = "bench_results"
+
+# Settings that change benchmark numbers; recorded next to every result
+CONFIG_KEYS = [
+    "MODEL_BACKEND", "FAKE_MODEL_LATENCY", "FAKE_MODEL_JITTER", "FAKE_MODEL_FAILURE_RATE",
+    "CHAT_MODE", "MODEL_WORKERS", "SESSION_STORE", "RESPONSE_CACHE", "CACHE_REPLIES",
+    "RAG_ENABLED", "KB_PERSIST_DIR", "KB_ENABLED", "KB_SNAPSHOT_DIR", "BACKGROUND_WARMUP",
+    "EMBEDDING_CACHE_PATH", "EMBEDDING_QUANTIZE", "EMBEDDING_BATCH_SIZE", "EMBEDDING_MAX_WAIT_MS",
+    "EMBEDDING_QUERY_CACHE_SIZE",
+]
+
+
+def summarize(samples):
+    """Latency summary in milliseconds (nearest-rank percentiles)"""
+    if not samples:
+        return {"count": 0}
+    ordered = sorted(samples)
+
+    def pick(q):
+        return ordered[min(len(ordered) - 1, max(0, int(round(q * len(ordered))) - 1))] * 1000
+
+    return {
+        "count": len(ordered),
+        "mean_ms": sum(ordered) / len(ordered) * 1000,
+        "p50_ms": pick(0.50),
+        "p95_ms": pick(0.95),
+        "p99_ms": pick(0.99),
+        "max_ms": ordered[-1] * 1000
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def write_results(name, results, output=None):
+    """Write one JSON document per run so releases can be compared"""
+    stamp = time.strftime("%Y%m%d-%H%M%S")
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        output = os.path.join(RESULTS_DIR, f"{name}-{stamp}.json")
+
+    payload = {
+        "benchmark": name,
+        "timestamp": stamp,
+        "git_revision": git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "config": {key: os.environ[key] for key in CONFIG_KEYS if key in os.environ},
+        "results": results
+    }
+    with open(output, "w") as f:
+        json.dump(payload, f, indent=2)
+    print(f"Results written to {output}")
+    return output
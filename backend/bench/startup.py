@@ -0,0 +1,108 @@
+"""Measure backend cold start: import time, app creation, time to ready and first request.
+
+Each run is a fresh interpreter, the way an autoscaled worker starts. Run from the
+backend directory:
+    python -m bench.startup --runs 3
+    python -m bench.startup --runs 3 --snapshot kb_snapshot   # also time KB_SNAPSHOT_DIR
+    python -m bench.startup --importtime                      # slowest imports of script.py
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+from bench.results import write_results
+
+CHILD = """
+import json, time
+start = time.perf_counter()
+import script
+imported = time.perf_counter()
+app = script.create_app()
+created = time.perf_counter()
+client = app.test_client()
+first = client.post('/api/chat', json={'message': 'hello', 'session_id': 'startup'})
+first_done = time.perf_counter()
+while client.get('/api/ready').status_code != 200 and time.perf_counter() - start < 600:
+    time.sleep(0.01)
+ready = time.perf_counter()
+print(json.dumps({
+    'import_s': imported - start,
+    'create_app_s': created - imported,
+    'first_request_s': first_done - created,
+    'first_request_status': first.status_code,
+    'ready_s': ready - start
+}))
+"""
+
+
+def scenarios(snapshot):
+    runs = [
+        ("no_kb", {"KB_ENABLED": "0", "RAG_ENABLED": "0"}),
+        ("kb_blocking", {"KB_ENABLED": "1", "BACKGROUND_WARMUP": "0"}),
+        ("kb_background", {"KB_ENABLED": "1", "BACKGROUND_WARMUP": "1"}),
+    ]
+    if snapshot:
+        runs.append(("kb_snapshot", {"KB_ENABLED": "1", "BACKGROUND_WARMUP": "1", "KB_SNAPSHOT_DIR": snapshot}))
+    return runs
+
+
+def run_child(overrides):
+    env = {**os.environ, "MODEL_BACKEND": os.environ.get("MODEL_BACKEND", "fake"),
+           "FAKE_MODEL_LATENCY": os.environ.get("FAKE_MODEL_LATENCY", "0"),
+           "LOG_LEVEL": "WARNING", **overrides}
+    out = subprocess.run(
+        [sys.executable, "-c", CHILD], env=env, capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def slowest_imports(limit):
+    """Cumulative import time per module from `python -X importtime -c 'import script'`"""
+    err = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import script"],
+        env={**os.environ, "MODEL_BACKEND": os.environ.get("MODEL_BACKEND", "fake")},
+        capture_output=True, text=True, check=True
+    ).stderr
+    rows = []
+    for line in err.splitlines():
+        parts = line.split("|")
+        if len(parts) == 3 and parts[1].strip().isdigit():
+            rows.append((int(parts[1]), parts[2].rstrip()))
+    return sorted(rows, reverse=True)[:limit]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--snapshot", default=None, help="Embedding snapshot directory to include")
+    parser.add_argument("--importtime", action="store_true")
+    parser.add_argument("--output", default=None)
+    args = parser.parse_args()
+
+    if args.importtime:
+        for micros, module in slowest_imports(15):
+            print(f"{micros / 1000:9.1f}ms {module}")
+        return
+
+    results = {}
+    print(f"{'scenario':<14} {'import':>8} {'app':>8} {'first req':>10} {'ready':>8}  (median of {args.runs}, seconds)")
+    for name, overrides in scenarios(args.snapshot):
+        samples = [run_child(overrides) for _ in range(args.runs)]
+        summary = {
+            key: statistics.median(s[key] for s in samples)
+            for key in ("import_s", "create_app_s", "first_request_s", "ready_s")
+        }
+        results[name] = {"overrides": overrides, "median": summary, "runs": samples}
+        print(
+            f"{name:<14} {summary['import_s']:8.3f} {summary['create_app_s']:8.3f} "
+            f"{summary['first_request_s']:10.3f} {summary['ready_s']:8.3f}"
+        )
+
+    write_results("startup", results, args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,189 @@
+import hashlib
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from embeddings import shared_service
+
+
+def normalize(text):
+    return re.sub(r'\s+', ' ', text or '').strip().lower()
+
+def prompt_hash(*parts):
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(normalize(part).encode('utf-8'))
+        digest.update(b'\x00')
+    return digest.hexdigest()
+
+
+class NullCache:
+    def get(self, namespace, text, scope="", embedding=None):
+        return None
+
+    def contains(self, namespace, text, scope="", embedding=None):
+        return False
+
+    def set(self, namespace, text, value, scope="", embedding=None):
+        pass
+
+    def stats(self):
+        return {'mode': 'off'}
+
+
+class ResponseCache:
+    """Exact-match LRU/TTL cache on a normalized prompt hash, with an optional semantic tier.
+
+    `text` is the part of the prompt that varies between near-identical requests (the
+    user message); `scope` is everything that must match exactly (history, assessment
+    context). The semantic tier only compares messages that share the same scope.
+    """
+
+    def __init__(self, max_entries=2048, ttl=3600, semantic=False, embed=None, similarity=0.92):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.semantic = semantic
+        self.embed = embed
+        if self.embed is None and semantic:
+            # User messages are queries: keep their vectors in memory, not in the on-disk cache
+            service = shared_service()
+            self.embed = lambda texts: service.embed(texts, persist=False)
+        self.similarity = similarity
+
+        self._entries = OrderedDict()
+        # (namespace, scope hash) -> [keys, vector matrix or None when stale]
+        self._groups = {}
+        self._lock = threading.Lock()
+        self._counters = {
+            'hits_exact': 0,
+            'hits_semantic': 0,
+            'misses': 0,
+            'sets': 0,
+            'evictions': 0,
+            'expired': 0
+        }
+
+    def _drop(self, key):
+        entry = self._entries.pop(key)
+        group = self._groups.get(entry['group'])
+        if group is not None:
+            group[0].remove(key)
+            group[1] = None
+            if not group[0]:
+                del self._groups[entry['group']]
+
+    def _lookup_exact(self, key, now):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry['expires'] < now:
+            self._drop(key)
+            self._counters['expired'] += 1
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def _lookup_semantic(self, group_key, vector, now):
+        group = self._groups.get(group_key)
+        if group is None:
+            return None
+        keys, matrix = group
+        if matrix is None:
+            matrix = np.vstack([self._entries[k]['vector'] for k in keys])
+            group[1] = matrix
+        scores = matrix @ vector
+        best = int(np.argmax(scores))
+        if scores[best] < self.similarity:
+            return None
+        return self._lookup_exact(keys[best], now)
+
+    def _vector(self, text, embedding):
+        vector = embedding if embedding is not None else self.embed([normalize(text)])[0]
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _find(self, namespace, text, scope, embedding):
+        """(entry, tier) for the best live match, or (None, None)"""
+        now = time.time()
+        key = prompt_hash(namespace, scope, text)
+        with self._lock:
+            entry = self._lookup_exact(key, now)
+            if entry is not None or not self.semantic:
+                return entry, 'exact'
+
+        vector = self._vector(text, embedding)
+        with self._lock:
+            return self._lookup_semantic(prompt_hash(namespace, scope), vector, now), 'semantic'
+
+    def get(self, namespace, text, scope="", embedding=None):
+        entry, tier = self._find(namespace, text, scope, embedding)
+        with self._lock:
+            if entry is None:
+                self._counters['misses'] += 1
+                return None
+            self._counters[f'hits_{tier}'] += 1
+            return entry['value']
+
+    def contains(self, namespace, text, scope="", embedding=None):
+        """Whether get() would hit, without counting towards the hit rate"""
+        entry, _ = self._find(namespace, text, scope, embedding)
+        return entry is not None
+
+    def set(self, namespace, text, value, scope="", embedding=None):
+        key = prompt_hash(namespace, scope, text)
+        group_key = prompt_hash(namespace, scope)
+        vector = self._vector(text, embedding) if self.semantic else None
+
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = {
+                'value': value,
+                'expires': time.time() + self.ttl,
+                'group': group_key,
+                'vector': vector
+            }
+            if self.semantic:
+                group = self._groups.setdefault(group_key, [[], None])
+                group[0].append(key)
+                group[1] = None
+            self._counters['sets'] += 1
+
+            while len(self._entries) > self.max_entries:
+                self._drop(next(iter(self._entries)))
+                self._counters['evictions'] += 1
+
+    def stats(self):
+        with self._lock:
+            counters = dict(self._counters)
+            entries = len(self._entries)
+        lookups = counters['hits_exact'] + counters['hits_semantic'] + counters['misses']
+        hits = counters['hits_exact'] + counters['hits_semantic']
+        return {
+            'mode': 'semantic' if self.semantic else 'exact',
+            'entries': entries,
+            'max_entries': self.max_entries,
+            'ttl_seconds': self.ttl,
+            'hit_rate': hits / lookups if lookups else 0.0,
+            **counters
+        }
+
+
+def create_response_cache():
+    """Build the cache selected by RESPONSE_CACHE (off, exact or semantic)"""
+    mode = os.getenv("RESPONSE_CACHE", "exact")
+    if mode == "off":
+        return NullCache()
+    if mode not in ("exact", "semantic"):
+        raise ValueError(f"Unknown RESPONSE_CACHE: {mode}")
+    return ResponseCache(
+        max_entries=int(os.getenv("RESPONSE_CACHE_SIZE", "2048")),
+        ttl=float(os.getenv("RESPONSE_CACHE_TTL", "3600")),
+        semantic=mode == "semantic",
+        similarity=float(os.getenv("RESPONSE_CACHE_SIMILARITY", "0.92"))
+    )
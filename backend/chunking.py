@@ -0,0 +1,195 @@
+"""Sentence-aware chunking under the embedding model's token limit, plus near-duplicate removal"""
+import hashlib
+import re
+import zlib
+
+import numpy as np
+
+# all-MiniLM-L6-v2 truncates at 256 word pieces, two of which are [CLS]/[SEP]
+MAX_TOKENS = 254
+
+PARAGRAPH_BREAK = re.compile(r'\n\s*\n')
+SENTENCE_END = re.compile(r'(?<=[.!?])\s+(?=["\'(\[]?[A-Z0-9])')
+TOKEN_PATTERN = re.compile(r'\w+|[^\w\s]')
+
+def estimate_tokens(text):
+    """Conservative word-piece estimate: long words usually split into several pieces"""
+    return sum(1 + len(token) // 7 for token in TOKEN_PATTERN.findall(text))
+
+def iter_sentences(pages):
+    """Yield (sentence, page_number, starts_paragraph) from a stream of (page_number, text).
+
+    A sentence that runs over a page break is carried into the next page.
+    """
+    carry, carry_page, carry_starts = "", None, True
+    for page_num, text in pages:
+        paragraphs = PARAGRAPH_BREAK.split(text)
+        for p_index, paragraph in enumerate(paragraphs):
+            paragraph = " ".join(paragraph.split())
+            if not paragraph:
+                continue
+            if carry:
+                paragraph = f"{carry} {paragraph}"
+                starts, start_page = carry_starts, carry_page
+                carry = ""
+            else:
+                starts, start_page = True, page_num
+
+            sentences = SENTENCE_END.split(paragraph)
+            last_paragraph = p_index == len(paragraphs) - 1
+            for s_index, sentence in enumerate(sentences):
+                is_last = s_index == len(sentences) - 1
+                if is_last and last_paragraph and not sentence.endswith(('.', '!', '?')):
+                    carry, carry_page, carry_starts = sentence, start_page, starts and s_index == 0
+                    break
+                yield sentence, start_page if s_index == 0 else page_num, starts and s_index == 0
+    if carry:
+        yield carry, carry_page, carry_starts
+
+def split_long_sentence(sentence, max_tokens, count_tokens):
+    pieces, current = [], []
+    for word in sentence.split():
+        if current and count_tokens(" ".join(current + [word])) > max_tokens:
+            pieces.append(" ".join(current))
+            current = []
+        current.append(word)
+    if current:
+        pieces.append(" ".join(current))
+    return pieces
+
+def chunk_sentences(pages, max_tokens=MAX_TOKENS, overlap_sentences=1, min_tokens=32,
+                    count_tokens=estimate_tokens):
+    """Pack whole sentences into chunks of at most `max_tokens`, preferring paragraph breaks.
+
+    Yields dicts with the chunk text, its page span, its word offset in the document and its
+    token estimate. The last chunk is merged into the previous one when it is tiny and fits.
+    """
+    current = []  # (sentence, page, word_offset, tokens)
+    current_tokens = 0
+    words_seen = 0
+    carried = 0  # overlap sentences at the start of `current`, already in `pending`
+    pending = None
+
+    def build(sentences):
+        return {
+            "text": " ".join(s for s, _, _, _ in sentences),
+            "page_start": sentences[0][1],
+            "page_end": sentences[-1][1],
+            "offset": sentences[0][2],
+            "tokens": sum(t for _, _, _, t in sentences)
+        }
+
+    for sentence, page_num, starts_paragraph in iter_sentences(pages):
+        tokens = count_tokens(sentence)
+        parts = [sentence] if tokens <= max_tokens else split_long_sentence(sentence, max_tokens, count_tokens)
+        for part in parts:
+            part_tokens = tokens if len(parts) == 1 else count_tokens(part)
+            over_budget = current and current_tokens + part_tokens > max_tokens
+            natural_break = starts_paragraph and current_tokens >= max_tokens // 2
+            if over_budget or natural_break:
+                if pending is not None:
+                    yield pending
+                pending = build(current)
+                overlap = current[-overlap_sentences:] if overlap_sentences else []
+                overlap_tokens = sum(t for _, _, _, t in overlap)
+                if overlap_tokens + part_tokens > max_tokens or overlap_tokens > max_tokens // 4:
+                    overlap = []
+                current = list(overlap)
+                carried = len(overlap)
+                current_tokens = sum(t for _, _, _, t in current)
+            current.append((part, page_num, words_seen, part_tokens))
+            current_tokens += part_tokens
+            words_seen += len(part.split())
+            starts_paragraph = False
+
+    if current:
+        last = build(current)
+        if pending is not None and current[carried:]:
+            # The overlap sentences are already in `pending`; only the new tail is merged
+            tail = build(current[carried:])
+            merged_tokens = pending["tokens"] + tail["tokens"]
+            if tail["tokens"] < min_tokens and merged_tokens <= max_tokens:
+                pending["text"] = f"{pending['text']} {tail['text']}"
+                pending["page_end"] = tail["page_end"]
+                pending["tokens"] = merged_tokens
+                last = None
+        if pending is not None:
+            yield pending
+        if last is not None:
+            yield last
+    elif pending is not None:
+        yield pending
+
+
+class MinHashDeduplicator:
+    """Drops exact and near-duplicate chunks (boilerplate headers, footers, references).
+
+    Near duplicates are found with MinHash over word shingles and LSH banding; a candidate
+    is dropped when its estimated Jaccard similarity to a kept chunk reaches `threshold`.
+    """
+
+    PRIME = (1 << 31) - 1
+
+    def __init__(self, num_perm=64, bands=16, threshold=0.85, shingle_size=5, seed=1):
+        if num_perm % bands:
+            raise ValueError("num_perm must be divisible by bands")
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.threshold = threshold
+        self.shingle_size = shingle_size
+
+        rng = np.random.RandomState(seed)
+        self._a = rng.randint(1, self.PRIME, size=num_perm).astype(np.uint64)
+        self._b = rng.randint(0, self.PRIME, size=num_perm).astype(np.uint64)
+
+        self._exact = set()
+        self._buckets = [{} for _ in range(bands)]
+        self._signatures = []
+        self.stats = {
+            "chunks_in": 0,
+            "kept": 0,
+            "exact_duplicates": 0,
+            "near_duplicates": 0
+        }
+
+    def signature(self, text):
+        words = text.lower().split()
+        size = min(self.shingle_size, len(words)) or 1
+        shingles = {" ".join(words[i:i + size]) for i in range(max(len(words) - size + 1, 1))}
+        hashes = np.fromiter(
+            (zlib.crc32(s.encode("utf-8")) for s in shingles), dtype=np.uint64, count=len(shingles)
+        )
+        return ((self._a[:, None] * hashes[None, :] + self._b[:, None]) % self.PRIME).min(axis=1)
+
+    def keep(self, text):
+        """Return True the first time a chunk's content is seen, False for duplicates"""
+        self.stats["chunks_in"] += 1
+        digest = hashlib.sha1(" ".join(text.lower().split()).encode("utf-8")).digest()
+        if digest in self._exact:
+            self.stats["exact_duplicates"] += 1
+            return False
+
+        signature = self.signature(text)
+        band_keys = [
+            signature[band * self.rows:(band + 1) * self.rows].tobytes() for band in range(self.bands)
+        ]
+        candidates = set()
+        for bucket, key in zip(self._buckets, band_keys):
+            candidates.update(bucket.get(key, ()))
+        for index in candidates:
+            if np.mean(self._signatures[index] == signature) >= self.threshold:
+                self.stats["near_duplicates"] += 1
+                return False
+
+        index = len(self._signatures)
+        self._signatures.append(signature)
+        for bucket, key in zip(self._buckets, band_keys):
+            bucket.setdefault(key, []).append(index)
+        self._exact.add(digest)
+        self.stats["kept"] += 1
+        return True
+
+    def report(self):
+        saved = self.stats["exact_duplicates"] + self.stats["near_duplicates"]
+        return {**self.stats, "embeddings_saved": saved}
@@ -0,0 +1,302 @@
+"""Shared sentence-embedding service: one MiniLM model per process, micro-batched queries
+and an on-disk cache keyed by content hash.
+
+Concurrent embed_query() calls are queued and encoded together in one forward pass.
+Document vectors are cached in SQLite under sha256(model name + text), so rebuilding the
+knowledge base does not run the model again; query vectors only live in a bounded
+in-memory LRU. Cached vectors can be stored on disk as float16 or int8; they are
+dequantized to float32 on read, so this cuts disk use, not resident memory.
+"""
+import hashlib
+import os
+import queue
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+import numpy as np
+
+DEFAULT_MODEL = "all-MiniLM-L6-v2"
+QUANTIZATIONS = (None, "float16", "int8")
+
+
+def text_key(model_name, text):
+    return hashlib.sha256(f"{model_name}\x00{text}".encode("utf-8")).hexdigest()
+
+def quantize(vector, mode):
+    """Return (blob, scale) for a float32 vector"""
+    if mode == "float16":
+        return vector.astype(np.float16).tobytes(), 1.0
+    if mode == "int8":
+        # Symmetric per-vector scale keeps cosine similarity within ~1% of float32
+        scale = float(np.abs(vector).max()) / 127 or 1.0
+        return np.round(vector / scale).astype(np.int8).tobytes(), scale
+    return vector.astype(np.float32).tobytes(), 1.0
+
+def dequantize(blob, dtype, scale):
+    return np.frombuffer(blob, dtype=dtype).astype(np.float32) * scale
+
+
+class EmbeddingCache:
+    """SQLite-backed vector cache; safe to share between threads and processes"""
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS embeddings (
+        key TEXT PRIMARY KEY,
+        dtype TEXT NOT NULL,
+        scale REAL NOT NULL,
+        vector BLOB NOT NULL
+    );
+    """
+
+    def __init__(self, path, quantization=None):
+        if quantization not in QUANTIZATIONS:
+            raise ValueError(f"Unknown embedding quantization: {quantization}")
+        self.path = path
+        self.quantization = quantization
+        self._local = threading.local()
+        self._conn().executescript(self.SCHEMA)
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get_many(self, keys):
+        found = {}
+        conn = self._conn()
+        # Stay under SQLite's bound-parameter limit
+        for start in range(0, len(keys), 500):
+            batch = keys[start:start + 500]
+            rows = conn.execute(
+                f"SELECT key, dtype, scale, vector FROM embeddings WHERE key IN ({','.join('?' * len(batch))})",
+                batch
+            )
+            for key, dtype, scale, blob in rows:
+                found[key] = dequantize(blob, dtype, scale)
+        return found
+
+    def put_many(self, items):
+        dtype = self.quantization or "float32"
+        rows = []
+        for key, vector in items:
+            blob, scale = quantize(np.asarray(vector, dtype=np.float32), self.quantization)
+            rows.append((key, dtype, scale, blob))
+        conn = self._conn()
+        conn.execute("BEGIN")
+        conn.executemany(
+            "INSERT OR REPLACE INTO embeddings (key, dtype, scale, vector) VALUES (?, ?, ?, ?)", rows
+        )
+        conn.execute("COMMIT")
+
+    def count(self):
+        return self._conn().execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+
+class EmbeddingService:
+    def __init__(self, model_name=DEFAULT_MODEL, cache=None, batch_size=32, max_wait_ms=5,
+                 encode=None, recent_size=4096):
+        self.model_name = model_name
+        self.cache = cache
+        self.recent_size = recent_size
+        self._recent = OrderedDict()  # key -> vector for queries, which are not written to disk
+        self._recent_lock = threading.Lock()
+        self.batch_size = batch_size
+        self.max_wait = max_wait_ms / 1000
+        # Tests and benchmarks can swap in their own encoder
+        self._encode = encode
+        self._model = None
+        self._model_lock = threading.Lock()
+
+        self._queue = queue.Queue()
+        self._worker = None
+        self._worker_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._counters = {
+            'texts': 0,
+            'cache_hits': 0,
+            'encoded': 0,
+            'forward_passes': 0,
+            'queued_queries': 0,
+            'query_batches': 0,
+            'max_query_batch': 0
+        }
+
+    def _count(self, **amounts):
+        with self._stats_lock:
+            for key, amount in amounts.items():
+                self._counters[key] += amount
+
+    def encode(self, texts):
+        """Run the model on `texts` (no cache), returning a float32 matrix"""
+        if self._encode is None:
+            with self._model_lock:
+                if self._model is None:
+                    from sentence_transformers import SentenceTransformer
+                    self._model = SentenceTransformer(self.model_name, device="cpu")
+            encode = lambda batch: self._model.encode(batch, batch_size=self.batch_size)
+        else:
+            encode = self._encode
+        self._count(encoded=len(texts), forward_passes=1)
+        return np.asarray(encode(list(texts)), dtype=np.float32)
+
+    def embed(self, texts, persist=True):
+        """Embed many texts, reusing cached vectors and encoding the rest in one pass.
+
+        Only `persist`ed vectors (documents) go to the on-disk cache; queries are kept in a
+        bounded in-memory LRU so user messages never accumulate on disk.
+        """
+        return self.embed_counted(texts, persist)[0]
+
+    def embed_counted(self, texts, persist=True):
+        """embed(), also returning how many of the texts were served from a cache"""
+        texts = list(texts)
+        if not texts:
+            return np.empty((0, 0), dtype=np.float32), 0
+        keys = [text_key(self.model_name, text) for text in texts]
+        with self._recent_lock:
+            cached = {key: self._recent[key] for key in keys if key in self._recent}
+            for key in cached:
+                self._recent.move_to_end(key)
+        if self.cache and len(cached) < len(keys):
+            cached.update(self.cache.get_many(sorted(set(keys) - set(cached))))
+
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in cached and key not in missing:
+                missing[key] = text
+        if missing:
+            vectors = self.encode(list(missing.values()))
+            computed = dict(zip(missing, vectors))
+            if persist and self.cache:
+                self.cache.put_many(computed.items())
+            else:
+                with self._recent_lock:
+                    self._recent.update(computed)
+                    while len(self._recent) > self.recent_size:
+                        self._recent.popitem(last=False)
+            cached.update(computed)
+
+        hits = len(texts) - len(missing)
+        self._count(texts=len(texts), cache_hits=hits)
+        return np.stack([cached[key] for key in keys]), hits
+
+    def embed_query(self, text, timeout=None):
+        """Embed one text, sharing a forward pass with other queries queued within max_wait_ms"""
+        self._ensure_worker()
+        future = Future()
+        self._queue.put((text, future))
+        return future.result(timeout=timeout)
+
+    def _ensure_worker(self):
+        if self._worker is not None:
+            return
+        with self._worker_lock:
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._batch_loop, name="embedding-batcher", daemon=True)
+                self._worker.start()
+
+    def _batch_loop(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.perf_counter() + self.max_wait
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            with self._stats_lock:
+                self._counters['queued_queries'] += len(batch)
+                self._counters['query_batches'] += 1
+                self._counters['max_query_batch'] = max(self._counters['max_query_batch'], len(batch))
+            try:
+                vectors = self.embed([text for text, _ in batch], persist=False)
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            for (_, future), vector in zip(batch, vectors):
+                future.set_result(vector)
+
+    def stats(self):
+        with self._stats_lock:
+            counters = dict(self._counters)
+        return {
+            'model': self.model_name,
+            'cache': self.cache.path if self.cache else None,
+            'quantization': self.cache.quantization if self.cache else None,
+            'recent_queries': len(self._recent),
+            'hit_rate': counters['cache_hits'] / counters['texts'] if counters['texts'] else 0.0,
+            'avg_query_batch': (
+                counters['queued_queries'] / counters['query_batches'] if counters['query_batches'] else 0.0
+            ),
+            **counters
+        }
+
+
+class ChromaEmbeddingFunction:
+    """Chroma embedding-function adapter so collection writes and text queries use the service.
+
+    Reports itself as chroma's sentence_transformer function, so collections created with it
+    still open with the stock embedding function.
+    """
+
+    def __init__(self, service):
+        self.service = service
+
+    def __call__(self, input):
+        return list(self.service.embed(input))
+
+    @staticmethod
+    def name():
+        return "sentence_transformer"
+
+    def get_config(self):
+        return {
+            "model_name": self.service.model_name,
+            "device": "cpu",
+            "normalize_embeddings": False,
+            "kwargs": {}
+        }
+
+    def is_legacy(self):
+        return False
+
+    def default_space(self):
+        return "l2"
+
+    def supported_spaces(self):
+        return ["cosine", "l2", "ip"]
+
+    def embed_query(self, input):
+        return list(self.service.embed(input, persist=False))
+
+
+_shared = None
+_shared_lock = threading.Lock()
+
+def shared_service():
+    """The process-wide service, configured from EMBEDDING_CACHE_PATH, EMBEDDING_QUANTIZE,
+    EMBEDDING_BATCH_SIZE, EMBEDDING_MAX_WAIT_MS and EMBEDDING_QUERY_CACHE_SIZE"""
+    global _shared
+    with _shared_lock:
+        if _shared is None:
+            path = os.getenv("EMBEDDING_CACHE_PATH", "embeddings.db")
+            cache = EmbeddingCache(path, os.getenv("EMBEDDING_QUANTIZE") or None) if path else None
+            _shared = EmbeddingService(
+                cache=cache,
+                batch_size=int(os.getenv("EMBEDDING_BATCH_SIZE", "32")),
+                max_wait_ms=float(os.getenv("EMBEDDING_MAX_WAIT_MS", "5")),
+                recent_size=int(os.getenv("EMBEDDING_QUERY_CACHE_SIZE", "4096"))
+            )
+        return _shared
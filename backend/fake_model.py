@@ -0,0 +1,92 @@
+import json
+import random
+import threading
+import time
+
+
+REPLY_TEXT = (
+    "That sounds like a lot to carry. Try breaking the next study block into "
+    "25-minute sessions with short breaks, and be kind to yourself in between."
+)
+
+SUMMARY_TEXT = "The student is stressed about upcoming exams and has been trying shorter study blocks."
+
+METRICS = {
+    "stress": 6,
+    "anxiety": 5,
+    "loneliness": 3,
+    "motivation": 5,
+    "financial_burden": 2,
+    "academic_pressure": 7
+}
+
+
+class FakeModelError(Exception):
+    """Simulated provider failure; reports 503 so the scheduler treats it as transient"""
+    code = 503
+
+
+class FakeResponse:
+    def __init__(self, text):
+        self.text = text
+
+
+class FakeGenerativeModel:
+    """Offline stand-in for genai.GenerativeModel.
+
+    latency/jitter are seconds per call (spread across chunks when streaming), failure_rate is
+    the probability a call raises FakeModelError, stream_chunk_words sets the chunk size.
+    """
+
+    def __init__(self, latency=0.8, jitter=0.0, failure_rate=0.0, stream_chunk_words=4, seed=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.stream_chunk_words = stream_chunk_words
+        self.calls = 0
+        self.failures = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def _delay(self):
+        delay = self.latency
+        if self.jitter:
+            with self._lock:
+                delay += self._random.uniform(-self.jitter, self.jitter)
+        return max(delay, 0)
+
+    def _maybe_fail(self):
+        with self._lock:
+            failed = self._random.random() < self.failure_rate
+            if failed:
+                self.failures += 1
+        if failed:
+            raise FakeModelError("Simulated model failure")
+
+    def generate_content(self, prompt, stream=False, **kwargs):
+        with self._lock:
+            self.calls += 1
+        if stream:
+            return self._stream(prompt)
+        time.sleep(self._delay())
+        self._maybe_fail()
+
+        if "running summary" in prompt:
+            return FakeResponse(SUMMARY_TEXT)
+        if "Combined JSON Response:" in prompt:
+            return FakeResponse(json.dumps({"reply": REPLY_TEXT, "metrics": METRICS}))
+        if "JSON Response:" in prompt:
+            return FakeResponse(json.dumps(METRICS))
+
+        return FakeResponse(REPLY_TEXT)
+
+    def _stream(self, prompt):
+        """Spread the call latency across word chunks, like a streamed reply"""
+        words = REPLY_TEXT.split(" ")
+        size = self.stream_chunk_words
+        pieces = [" ".join(words[i:i + size]) for i in range(0, len(words), size)]
+        delay = self._delay()
+        self._maybe_fail()
+        for i, piece in enumerate(pieces):
+            time.sleep(delay / len(pieces))
+            yield FakeResponse(piece if i == 0 else " " + piece)
@@ -0,0 +1,79 @@
+"""Gunicorn settings, overridable through the environment.
+
+Chat requests spend almost all of their time waiting on the model API, so each worker
+serves many requests concurrently with threads (gthread, the default) or greenlets
+(WORKER_CLASS=gevent). The app is not preloaded: every worker builds its own model
+client, executors and knowledge base after forking, so anything shared between workers
+(sessions, the persistent knowledge base) has to live outside the process.
+"""
+import multiprocessing
+import os
+import signal
+import subprocess
+import sys
+import threading
+
+bind = os.getenv("BIND", "0.0.0.0:5000")
+workers = int(os.getenv("WEB_CONCURRENCY", str(min(multiprocessing.cpu_count() * 2 + 1, 8))))
+worker_class = os.getenv("WORKER_CLASS", "gthread")
+# Threads per worker for gthread, open connections per worker for gevent
+threads = int(os.getenv("WORKER_THREADS", "16"))
+worker_connections = int(os.getenv("WORKER_CONNECTIONS", "500"))
+
+# In-memory sessions would be split across workers; share them through SQLite instead
+if workers > 1:
+    session_store = os.environ.setdefault("SESSION_STORE", "sqlite")
+    if session_store == "memory":
+        raise RuntimeError(
+            f"SESSION_STORE=memory keeps sessions per process; use SESSION_STORE=sqlite "
+            f"or WEB_CONCURRENCY=1 (got {workers} workers)"
+        )
+
+# Streaming replies can stay open for as long as the model keeps generating
+timeout = int(os.getenv("WORKER_TIMEOUT", "120"))
+# Time a worker gets after SIGTERM to finish in-flight requests and deferred metrics
+graceful_timeout = int(os.getenv("GRACEFUL_TIMEOUT", "30"))
+# Seconds a worker keeps serving after SIGTERM with /api/ready returning 503, so load
+# balancers stop routing to it before it stops accepting connections
+drain_seconds = float(os.getenv("SHUTDOWN_DRAIN_SECONDS", "0"))
+keepalive = int(os.getenv("KEEPALIVE", "5"))
+
+# Recycle workers now and then so slow leaks in client libraries cannot build up
+max_requests = int(os.getenv("MAX_REQUESTS", "2000"))
+max_requests_jitter = int(os.getenv("MAX_REQUESTS_JITTER", "200"))
+
+preload_app = False
+
+accesslog = os.getenv("ACCESS_LOG", "-")
+loglevel = os.getenv("LOG_LEVEL", "info").lower()
+
+
+def on_starting(server):
+    """Build the persistent knowledge base once, before any worker opens it read-only"""
+    kb_enabled = os.getenv("RAG_ENABLED", "0") == "1" or os.getenv("KB_ENABLED", "0") == "1"
+    if kb_enabled and os.getenv("KB_PERSIST_DIR"):
+        subprocess.run(
+            [sys.executable, "kb.py"], cwd=os.path.dirname(os.path.abspath(__file__)), check=True
+        )
+        os.environ["KB_READ_ONLY"] = "1"
+
+
+def post_worker_init(worker):
+    """Report not-ready as soon as SIGTERM arrives, then drain after `drain_seconds`"""
+    import script
+
+    handle_exit = worker.handle_exit
+
+    def on_sigterm(sig, frame):
+        script.readiness['shutting_down'] = True
+        if drain_seconds > 0:
+            threading.Timer(drain_seconds, handle_exit, (sig, frame)).start()
+        else:
+            handle_exit(sig, frame)
+
+    signal.signal(signal.SIGTERM, on_sigterm)
+
+
+def worker_exit(server, worker):
+    import script
+    script.shutdown_resources()
@@ -0,0 +1,191 @@
+"""Prompt-ready conversation history: a token-budgeted recent window plus a rolling summary.
+
+Messages that fall out of the window are folded into the session's summary in the
+background once at least `summary_every` turns have piled up, so long sessions keep
+their context while the prompt stays bounded.
+"""
+import logging
+import os
+import threading
+from collections import OrderedDict, deque
+
+from chunking import estimate_tokens
+
+logger = logging.getLogger("mindly.history")
+
+SPEAKERS = {'user': 'User', 'bot': 'Bot'}
+
+SUMMARY_PROMPT = """You maintain a short running summary of a student's conversation with Mindly, a supportive mental health assistant.
+
+Current summary:
+{summary}
+
+Earlier messages to fold in:
+{messages}
+
+Write the updated summary in at most {words} words. Keep what matters for ongoing support: the student's situation, concerns, feelings, what has been suggested and what helped. Return only the summary."""
+
+
+def render_message(message):
+    return f"{SPEAKERS.get(message['role'], message['role'].title())}: {message['text']}"
+
+
+class HistoryManager:
+    def __init__(self, store, summarize, executor, token_budget=600, summary_every=4,
+                 summary_words=120, cache_size=2048):
+        self.store = store
+        self.summarize = summarize
+        self.executor = executor
+        self.token_budget = token_budget
+        self.summary_every = summary_every
+        self.summary_words = summary_words
+        self.cache_size = cache_size
+
+        self._rendered = OrderedDict()  # session id -> rendered window state
+        self._summarizing = set()
+        self._lock = threading.Lock()
+        self._counters = {
+            'renders': 0,
+            'cache_hits': 0,
+            'summaries': 0,
+            'summary_failures': 0
+        }
+
+    def window(self, session):
+        """Newest unsummarized messages that fit the token budget, oldest first"""
+        messages, used = [], 0
+        for message in reversed(session['history']):
+            if message['seq'] <= session['summary_through']:
+                break
+            tokens = estimate_tokens(message['text']) + 2
+            if messages and used + tokens > self.token_budget:
+                break
+            messages.append(message)
+            used += tokens
+        messages.reverse()
+        return messages
+
+    def render(self, session_id, session):
+        """Conversation history for the prompt.
+
+        Each session keeps its rendered window lines and their token counts, so a new turn only
+        renders the messages added since the last call and drops the ones that left the window.
+        """
+        history = session['history']
+        last_seq = history[-1]['seq'] if history else 0
+        with self._lock:
+            cached = self._rendered.get(session_id)
+            if cached is not None:
+                self._rendered.move_to_end(session_id)
+
+        reusable = (
+            cached is not None
+            and cached['summary_through'] == session['summary_through']
+            and cached['last_seq'] <= last_seq
+        )
+        if reusable and cached['last_seq'] == last_seq:
+            with self._lock:
+                self._counters['cache_hits'] += 1
+            return cached['text']
+
+        if reusable:
+            entries, used = deque(cached['entries']), cached['used']
+            new = [m for m in history if m['seq'] > cached['last_seq']]
+            # Messages trimmed from the store can no longer be in the window
+            first_seq = history[0]['seq'] if history else 0
+            while entries and entries[0][0] < first_seq:
+                used -= entries.popleft()[2]
+        else:
+            entries, used = deque(), 0
+            new = self.window(session)
+        for message in new:
+            tokens = estimate_tokens(message['text']) + 2
+            entries.append((message['seq'], render_message(message), tokens))
+            used += tokens
+        while len(entries) > 1 and used > self.token_budget:
+            used -= entries.popleft()[2]
+
+        lines = [line for _, line, _ in entries]
+        if session['summary']:
+            lines.insert(0, f"Summary of earlier conversation: {session['summary']}")
+        text = "\n".join(lines)
+
+        with self._lock:
+            self._counters['cache_hits' if reusable else 'renders'] += 1
+            self._rendered[session_id] = {
+                'summary_through': session['summary_through'],
+                'last_seq': last_seq,
+                'entries': entries,
+                'used': used,
+                'text': text
+            }
+            self._rendered.move_to_end(session_id)
+            while len(self._rendered) > self.cache_size:
+                self._rendered.popitem(last=False)
+        return text
+
+    def maybe_summarize(self, session_id):
+        """Schedule a summary refresh after an exchange has been stored"""
+        with self._lock:
+            if session_id in self._summarizing:
+                return
+            self._summarizing.add(session_id)
+        try:
+            self.executor.submit(self._refresh_summary, session_id)
+        except RuntimeError:
+            # Executor already shut down
+            with self._lock:
+                self._summarizing.discard(session_id)
+
+    def _refresh_summary(self, session_id):
+        try:
+            session = self.store.get(session_id)
+            if session is None:
+                return
+            window = self.window(session)
+            start = window[0]['seq'] if window else float('inf')
+            older = [
+                m for m in session['history']
+                if session['summary_through'] < m['seq'] < start
+            ]
+            if len(older) < 2 * self.summary_every:
+                return
+
+            prompt = SUMMARY_PROMPT.format(
+                summary=session['summary'] or "(none yet)",
+                messages="\n".join(render_message(m) for m in older),
+                words=self.summary_words
+            )
+            summary = self.summarize(prompt).strip()
+            if summary:
+                self.store.save_summary(session_id, summary, older[-1]['seq'])
+                with self._lock:
+                    self._counters['summaries'] += 1
+        except Exception as e:
+            logger.warning("Error summarizing history: %s", e)
+            with self._lock:
+                self._counters['summary_failures'] += 1
+        finally:
+            with self._lock:
+                self._summarizing.discard(session_id)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'token_budget': self.token_budget,
+                'summary_every': self.summary_every,
+                'cached_sessions': len(self._rendered),
+                'summarizing': len(self._summarizing),
+                **self._counters
+            }
+
+
+def create_history_manager(store, summarize, executor):
+    """Build the manager from HISTORY_TOKEN_BUDGET and HISTORY_SUMMARY_EVERY"""
+    return HistoryManager(
+        store,
+        summarize,
+        executor,
+        token_budget=int(os.getenv("HISTORY_TOKEN_BUDGET", "600")),
+        summary_every=int(os.getenv("HISTORY_SUMMARY_EVERY", "4"))
+    )
@@ -1,35 +1,122 @@
-import chromadb
-from chromadb.utils import embedding_functions
+import hashlib
+import json
 import os
+import time
+
+COLLECTION_NAME = "mental_health_resources"
+
+def build_filter(category=None, doc_type=None):
+    """Chroma `where` clause for the category/type metadata; each may be a value or a list"""
+    clauses = []
+    for field, value in (("category", category), ("type", doc_type)):
+        if value is None:
+            continue
+        if isinstance(value, (list, tuple)):
+            clauses.append({field: {"$in": list(value)}})
+        else:
+            clauses.append({field: value})
+    if not clauses:
+        return None
+    return clauses[0] if len(clauses) == 1 else {"$and": clauses}
+
+def content_hash(document, metadata):
+    """Hash of a document and its metadata, used to skip re-embedding unchanged content"""
+    payload = json.dumps({"document": document, "metadata": metadata}, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
 
 class MentalHealthKnowledgeBase:
-    def __init__(self):
-        # Initialize ChromaDB client with persistent storage
-        self.client = chromadb.Client()
+    def __init__(self, persist_directory=None, snapshot_directory=None, read_only=None):
+        start = time.perf_counter()
+        # chromadb and sentence-transformers take seconds to import; only pay for them here
+        import chromadb
+        from embeddings import ChromaEmbeddingFunction, shared_service
+
+        persist_directory = persist_directory or os.getenv("KB_PERSIST_DIR")
+        self.persistent = bool(persist_directory)
+        # Chroma's persistent client is not multi-process safe: gunicorn workers open a store
+        # built once beforehand (python kb.py) and never write to it
+        if read_only is None:
+            read_only = os.getenv("KB_READ_ONLY", "0") == "1"
+        self.read_only = read_only and self.persistent
         
-        # Use sentence transformers for embeddings
-        self.embedding_function = embedding_functions.SentenceTransformerEmbeddingFunction(
-            model_name="all-MiniLM-L6-v2"
-        )
+        # Sentence-transformers embeddings through the shared service: batched queries and an
+        # on-disk cache, so rebuilding the collection does not re-run the model
+        self.embedding_service = shared_service()
+        self.model_name = self.embedding_service.model_name
+        self.embedding_function = ChromaEmbeddingFunction(self.embedding_service)
         
-        # Delete existing collection and create fresh one
-        try:
-            self.client.delete_collection(name="mental_health_resources")
-            print("🗑️  Deleted existing collection")
-        except:
-            pass
-        
-        # Create collection
-        self.collection = self.client.create_collection(
-            name="mental_health_resources",
-            embedding_function=self.embedding_function
-        )
+        # Pre-built vectors (see kb_snapshot.py) stand in for embedding unchanged documents
+        if snapshot_directory is None:
+            snapshot_directory = os.getenv("KB_SNAPSHOT_DIR")
+        self.snapshot = None
+        self.from_snapshot = 0
+        # Documents whose vectors came from the embedding service's on-disk cache
+        self.from_cache = 0
+        if snapshot_directory:
+            from kb_snapshot import EmbeddingSnapshot
+            try:
+                self.snapshot = EmbeddingSnapshot(snapshot_directory, self.model_name)
+                print(f"📦 Memory-mapped {len(self.snapshot)} snapshot embeddings")
+            except (OSError, ValueError) as e:
+                print(f"⚠️  Ignoring embedding snapshot: {e}")
+        
+        if self.persistent:
+            # Keep the on-disk collection; sync_documents only re-embeds what changed
+            self.client = chromadb.PersistentClient(path=persist_directory)
+            if self.read_only:
+                self.collection = self.client.get_collection(
+                    name=COLLECTION_NAME,
+                    embedding_function=self.embedding_function
+                )
+            else:
+                self.collection = self.client.get_or_create_collection(
+                    name=COLLECTION_NAME,
+                    embedding_function=self.embedding_function
+                )
+        else:
+            self.client = chromadb.Client()
+            
+            # Delete existing collection and create fresh one
+            try:
+                self.client.delete_collection(name=COLLECTION_NAME)
+                print("🗑️  Deleted existing collection")
+            except:
+                pass
+            
+            # Create collection
+            self.collection = self.client.create_collection(
+                name=COLLECTION_NAME,
+                embedding_function=self.embedding_function
+            )
         
-        # Always populate on initialization
-        self.populate_knowledge_base()
+        embedded = 0 if self.read_only else self.populate_knowledge_base()
+        
+        if self.read_only:
+            mode = "read-only"
+        elif self.from_snapshot:
+            mode = "snapshot"
+        else:
+            mode = "warm" if self.persistent and embedded == 0 and self.from_cache == 0 else "cold"
+        self.startup_stats = {
+            "mode": mode,
+            "persistent": self.persistent,
+            "documents": self.collection.count(),
+            "embedded": embedded,
+            "cache_hits": self.from_cache,
+            "from_snapshot": self.from_snapshot,
+            "seconds": round(time.perf_counter() - start, 3)
+        }
+        print(
+            f"⏱️  Knowledge base ready ({self.startup_stats['mode']} start): "
+            f"{self.startup_stats['documents']} documents, {embedded} embedded, "
+            f"{self.from_cache} from the embedding cache in {self.startup_stats['seconds']}s"
+        )
     
     def populate_knowledge_base(self):
-        """Add mental health resources and coping strategies to the database"""
+        """Add mental health resources and coping strategies to the database.
+        
+        Returns the number of documents that had to be embedded.
+        """
         
         documents = [
             # Stress Management
@@ -101,14 +188,115 @@ class MentalHealthKnowledgeBase:
         
         # Ensure we have data before adding
         if documents and metadatas and ids:
-            self.collection.add(
-                documents=documents,
-                metadatas=metadatas,
-                ids=ids
-            )
-            print(f"✅ Added {len(documents)} documents to knowledge base")
-        else:
-            print("⚠️  No documents to add")
+            embedded = self.sync_documents(documents, metadatas, ids, group="curated")
+            print(f"✅ Knowledge base has {len(documents)} curated documents ({embedded} embedded)")
+            return embedded
+        print("⚠️  No documents to add")
+        return 0
+    
+    def sync_documents(self, documents, metadatas, ids, group, batch_size=64):
+        """Upsert a group of documents, embedding only those whose content hash changed.
+        
+        Changed documents are embedded and written `batch_size` at a time. Documents previously
+        stored under the same group but missing from `ids` are removed.
+        Vectors found in the embedding snapshot or the embedding cache are reused instead of
+        recomputed. Returns the number of documents that went through the model.
+        """
+        hashes = [content_hash(doc, meta) for doc, meta in zip(documents, metadatas)]
+        fingerprint = hashlib.sha256(
+            "".join(f"{doc_id}:{h};" for doc_id, h in sorted(zip(ids, hashes))).encode("utf-8")
+        ).hexdigest()
+        fingerprint_key = f"fingerprint:{group}"
+        
+        collection_metadata = dict(self.collection.metadata or {})
+        if collection_metadata.get(fingerprint_key) == fingerprint:
+            return 0
+        
+        existing = self.collection.get(where={"kb_group": group}, include=["metadatas"])
+        stored = {
+            doc_id: (meta or {}).get("content_hash")
+            for doc_id, meta in zip(existing["ids"], existing["metadatas"])
+        }
+        
+        changed = [i for i, doc_id in enumerate(ids) if stored.get(doc_id) != hashes[i]]
+        embedded = 0
+        for start in range(0, len(changed), batch_size):
+            batch = changed[start:start + batch_size]
+            vectors = self.snapshot.lookup([hashes[i] for i in batch]) if self.snapshot else {}
+            prebuilt = [i for i in batch if hashes[i] in vectors]
+            fresh = [i for i in batch if hashes[i] not in vectors]
+            cache_hits = 0
+            if fresh:
+                computed, cache_hits = self.embedding_service.embed_counted([documents[i] for i in fresh])
+                vectors.update(zip((hashes[i] for i in fresh), computed.tolist()))
+            for part in (prebuilt, fresh):
+                if not part:
+                    continue
+                self.collection.upsert(
+                    documents=[documents[i] for i in part],
+                    embeddings=[vectors[hashes[i]] for i in part],
+                    metadatas=[
+                        {**metadatas[i], "kb_group": group, "content_hash": hashes[i]} for i in part
+                    ],
+                    ids=[ids[i] for i in part]
+                )
+            self.from_snapshot += len(prebuilt)
+            self.from_cache += cache_hits
+            embedded += len(fresh) - cache_hits
+        
+        stale = sorted(set(stored) - set(ids))
+        if stale:
+            self.collection.delete(ids=stale)
+        
+        collection_metadata[fingerprint_key] = fingerprint
+        self.collection.modify(metadata=collection_metadata)
+        return embedded
+    
+    def embed_query(self, query_text):
+        """Embed a query once so the vector can be reused for retrieval and caching.
+        
+        Concurrent calls are grouped into a single forward pass by the embedding service.
+        """
+        return self.embedding_service.embed_query(query_text).tolist()
+    
+    def query_by_embedding(self, embedding, n_results=3):
+        """Query with a precomputed embedding, skipping the embedding step"""
+        results = self.collection.query(
+            query_embeddings=[embedding],
+            n_results=n_results
+        )
+        return results['documents'][0] if results['documents'] else []
+    
+    def query_batch(self, query_texts, n_results=3, where=None):
+        """Query many texts at once, embedding them in a single forward pass.
+        
+        Returns one list per query of {"id", "document", "metadata", "distance", "score"}
+        dicts, best match first. Errors are raised rather than swallowed.
+        """
+        if not query_texts:
+            return []
+        embeddings = self.embedding_service.embed(query_texts, persist=False).tolist()
+        results = self.collection.query(
+            query_embeddings=embeddings,
+            n_results=n_results,
+            where=where,
+            include=["documents", "metadatas", "distances"]
+        )
+        batch = []
+        for ids, documents, metadatas, distances in zip(
+            results['ids'], results['documents'], results['metadatas'], results['distances']
+        ):
+            batch.append([
+                {
+                    "id": doc_id,
+                    "document": document,
+                    "metadata": metadata,
+                    "distance": distance,
+                    "score": 1 / (1 + distance)
+                }
+                for doc_id, document, metadata, distance in zip(ids, documents, metadatas, distances)
+            ])
+        return batch
     
     def query_knowledge(self, query_text, n_results=3):
         """Query the knowledge base for relevant information"""
@@ -144,4 +332,11 @@ class MentalHealthKnowledgeBase:
             )
             print(f"✅ Added {len(documents)} documents in batch")
         except Exception as e:
-            print(f"Error adding documents in batch: {e}")
\ No newline at end of file
+            print(f"Error adding documents in batch: {e}")
+
+
+if __name__ == "__main__":
+    # Build or sync the persistent store once, e.g. before starting several gunicorn workers
+    if not os.getenv("KB_PERSIST_DIR"):
+        raise SystemExit("Set KB_PERSIST_DIR to the store to build")
+    MentalHealthKnowledgeBase(read_only=False)
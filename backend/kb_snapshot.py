@@ -0,0 +1,77 @@
+"""Pre-built knowledge base embeddings that workers memory-map instead of recomputing.
+
+A snapshot is a directory holding `embeddings.npy` (float32, one row per document) and
+`index.json` (model name plus the content hash of each row). At startup the knowledge
+base looks documents up by content hash and upserts the stored vectors, so only
+documents added or edited since the snapshot are embedded.
+
+Build one from the backend directory (embeds everything once, then writes it out):
+    python kb_snapshot.py --output kb_snapshot
+"""
+import argparse
+import json
+import os
+
+import numpy as np
+
+EMBEDDINGS_FILE = "embeddings.npy"
+INDEX_FILE = "index.json"
+
+
+class EmbeddingSnapshot:
+    def __init__(self, directory, model_name=None):
+        with open(os.path.join(directory, INDEX_FILE)) as f:
+            index = json.load(f)
+        if model_name and index["model_name"] != model_name:
+            raise ValueError(
+                f"Snapshot was built with {index['model_name']}, knowledge base uses {model_name}"
+            )
+        self.model_name = index["model_name"]
+        # Pages are only read for the rows that are used, and shared between workers
+        self.embeddings = np.load(os.path.join(directory, EMBEDDINGS_FILE), mmap_mode="r")
+        self.rows = {content_hash: row for row, content_hash in enumerate(index["content_hashes"])}
+
+    def __len__(self):
+        return len(self.rows)
+
+    def lookup(self, content_hashes):
+        """Vectors for the hashes present in the snapshot, as {hash: list of floats}"""
+        return {
+            h: self.embeddings[self.rows[h]].tolist() for h in content_hashes if h in self.rows
+        }
+
+
+def write_snapshot(collection, directory, model_name):
+    """Dump every stored embedding from a Chroma collection, keyed by content hash"""
+    stored = collection.get(include=["embeddings", "metadatas"])
+    content_hashes, vectors = [], []
+    for metadata, vector in zip(stored["metadatas"], stored["embeddings"]):
+        content_hash = (metadata or {}).get("content_hash")
+        if content_hash and content_hash not in content_hashes:
+            content_hashes.append(content_hash)
+            vectors.append(vector)
+
+    os.makedirs(directory, exist_ok=True)
+    matrix = np.asarray(vectors, dtype=np.float32).reshape(len(vectors), -1)
+    np.save(os.path.join(directory, EMBEDDINGS_FILE), matrix)
+    with open(os.path.join(directory, INDEX_FILE), "w") as f:
+        json.dump({"model_name": model_name, "content_hashes": content_hashes}, f)
+    return len(content_hashes)
+
+
+def main():
+    from kb import MentalHealthKnowledgeBase
+
+    parser = argparse.ArgumentParser(description="Write the knowledge base embeddings to a snapshot")
+    parser.add_argument("--output", default="kb_snapshot")
+    parser.add_argument("--persist-dir", default=None,
+                        help="Snapshot an existing persistent store (includes ingested PDFs)")
+    args = parser.parse_args()
+
+    kb = MentalHealthKnowledgeBase(persist_directory=args.persist_dir, snapshot_directory="")
+    count = write_snapshot(kb.collection, args.output, kb.model_name)
+    print(f"📦 Wrote {count} embeddings to {args.output}/")
+
+
+if __name__ == "__main__":
+    main()
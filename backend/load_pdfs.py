@@ -1,9 +1,18 @@
 from kb import MentalHealthKnowledgeBase
-from pdf_loader import load_pdf_to_knowledge_base
+from pdf_loader import chunk_pdf, store_chunks
+from chunking import MinHashDeduplicator
+from concurrent.futures import ProcessPoolExecutor
+import argparse
 import os
+import time
 
-def load_all_pdfs():
-    """Load all PDFs from the data directory"""
+def load_all_pdfs(workers=None, batch_size=64):
+    """Load all PDFs from the data directory.
+    
+    PDFs are extracted and chunked in a process pool; chunks are embedded and written
+    in the parent as each PDF finishes, so embedding overlaps with extraction. Results are
+    consumed in list order so duplicate removal keeps the same chunks on every run.
+    """
     kb = MentalHealthKnowledgeBase()
     
     pdf_files = [
@@ -35,33 +44,53 @@ def load_all_pdfs():
     ]
     
     total_chunks = 0
+    total_pages = 0
     successful = 0
     failed = 0
     
+    available = []
     for pdf_info in pdf_files:
         if os.path.exists(pdf_info["path"]):
+            available.append(pdf_info)
+        else:
+            print(f"PDF not found: {pdf_info['path']}")
+            failed += 1
+    
+    deduplicator = MinHashDeduplicator()
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [
+            pool.submit(chunk_pdf, pdf_info["path"], pdf_info["category"], pdf_info["source"])
+            for pdf_info in available
+        ]
+        for pdf_info, future in zip(available, futures):
             try:
-                chunks = load_pdf_to_knowledge_base(
-                    pdf_info["path"],
-                    kb,
-                    category=pdf_info["category"],
-                    source=pdf_info["source"]
-                )
-                total_chunks += chunks
+                chunked = future.result()
+                total_chunks += store_chunks(kb, chunked, batch_size=batch_size, deduplicator=deduplicator)
+                total_pages += chunked["pages"]
                 successful += 1
             except Exception as e:
                 print(f"Error loading {pdf_info['path']}: {e}")
                 failed += 1
-        else:
-            print(f"PDF not found: {pdf_info['path']}")
-            failed += 1
+    elapsed = time.perf_counter() - start
     
     print(f"\n{'='*50}")
     print(f"Successfully loaded: {successful} PDFs")
     print(f"Failed: {failed} PDFs")
     print(f"Total chunks created: {total_chunks}")
+    dedup = deduplicator.report()
+    print(
+        f"Duplicates skipped: {dedup['exact_duplicates']} exact, {dedup['near_duplicates']} near "
+        f"({dedup['embeddings_saved']} embeddings saved)"
+    )
+    if elapsed > 0:
+        print(f"Throughput: {total_pages / elapsed:.1f} pages/sec, {total_chunks / elapsed:.1f} chunks/sec")
     print(f"Total documents in knowledge base: {kb.collection.count()}")
     print(f"{'='*50}")
 
 if __name__ == "__main__":
-    load_all_pdfs()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Load research PDFs into the knowledge base")
+    parser.add_argument("--workers", type=int, default=None, help="extraction processes (default: CPU count)")
+    parser.add_argument("--batch-size", type=int, default=64, help="chunks embedded per batch")
+    args = parser.parse_args()
+    load_all_pdfs(workers=args.workers, batch_size=args.batch_size)
\ No newline at end of file
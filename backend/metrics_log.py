@@ -0,0 +1,187 @@
+"""Append-only columnar log of per-turn metrics for cohort analytics.
+
+Rows are buffered in memory and flushed as NumPy segment files (one structured array per
+file). Every process writes its own segments, so gunicorn workers never contend for a
+file, and readers memory-map the segments instead of touching the session store. Small
+segments are periodically merged so the number of files a reader opens stays bounded.
+"""
+import hashlib
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows dev server: a single process, so the thread lock is enough
+    fcntl = None
+
+from structured import METRIC_KEYS
+
+ROW_DTYPE = np.dtype([
+    ("timestamp", "f8"),
+    ("session", "u8"),
+    ("turn", "i4"),
+    ("fallback", "u1"),
+    ("metrics", "f4", (len(METRIC_KEYS),)),
+])
+
+SESSIONS_FILE = "sessions.tsv"
+LOCK_FILE = ".lock"
+
+_compact_lock = threading.Lock()
+
+
+def session_key(session_id):
+    """Stable 64-bit id for a session, the same in every process"""
+    return int.from_bytes(hashlib.blake2b(str(session_id).encode("utf-8"), digest_size=8).digest(), "little")
+
+def session_label(session_id):
+    """Session id as written to sessions.tsv; tabs and newlines would break the line format"""
+    return str(session_id).replace("\t", " ").replace("\r", " ").replace("\n", " ")
+
+
+def segment_names(directory):
+    """Finished segment files, oldest first"""
+    return sorted(
+        (name for name in os.listdir(directory) if name.startswith("segment-") and ".tmp" not in name),
+        key=lambda name: int(name.split("-")[2])
+    )
+
+@contextmanager
+def directory_lock(directory, exclusive):
+    """Readers share the lock; compaction takes it exclusively while it swaps files"""
+    if fcntl is None:
+        yield
+        return
+    with open(os.path.join(directory, LOCK_FILE), "a") as f:
+        fcntl.flock(f, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+def compact(directory, min_segments=16, max_rows=262144):
+    """Merge segments smaller than `max_rows` once there are `min_segments` of them.
+
+    Large segments are left alone, so each compaction only rewrites recent data. Returns
+    the number of segments merged.
+    """
+    with _compact_lock, directory_lock(directory, exclusive=True):
+        small = []
+        for name in segment_names(directory):
+            rows = np.load(os.path.join(directory, name), mmap_mode="r")
+            if len(rows) < max_rows:
+                small.append((name, rows))
+        if len(small) < min_segments:
+            return 0
+
+        merged = np.concatenate([rows for _, rows in small])
+        # Keep the oldest merged timestamp in the name so segments still sort oldest first
+        stamp = small[0][0].split("-")[2]
+        path = os.path.join(directory, f"segment-{os.getpid()}-{stamp}-compact{int(time.time() * 1000)}.npy")
+        np.save(path + ".tmp.npy", merged)
+        del merged
+        os.replace(path + ".tmp.npy", path)
+        for name, _ in small:
+            os.remove(os.path.join(directory, name))
+        return len(small)
+
+
+class MetricsLog:
+    def __init__(self, directory, flush_rows=256, flush_seconds=30, compact_segments=16):
+        self.directory = directory
+        self.flush_rows = flush_rows
+        self.flush_seconds = flush_seconds
+        self.compact_segments = compact_segments
+        os.makedirs(directory, exist_ok=True)
+
+        self._rows = []
+        self._new_sessions = {}
+        self._known_sessions = set()
+        self._segment = 0
+        self._last_flush = time.time()
+        self._lock = threading.Lock()
+
+    def append(self, session_id, turn, metrics, fallback=False):
+        key = session_key(session_id)
+        values = tuple(float(metrics.get(name, np.nan)) for name in METRIC_KEYS)
+        with self._lock:
+            self._rows.append((time.time(), key, turn, fallback, values))
+            if key not in self._known_sessions:
+                self._known_sessions.add(key)
+                self._new_sessions[key] = session_label(session_id)
+            due = (
+                len(self._rows) >= self.flush_rows
+                or time.time() - self._last_flush >= self.flush_seconds
+            )
+        if due:
+            self.flush()
+
+    def flush(self):
+        """Write buffered rows as a new segment; returns the number of rows written"""
+        with self._lock:
+            rows, self._rows = self._rows, []
+            sessions, self._new_sessions = self._new_sessions, {}
+            self._last_flush = time.time()
+            if not rows:
+                return 0
+            self._segment += 1
+            name = f"segment-{os.getpid()}-{int(time.time() * 1000)}-{self._segment:06d}.npy"
+
+            # Session names first, so a segment never references an unknown session
+            if sessions:
+                with open(os.path.join(self.directory, SESSIONS_FILE), "a") as f:
+                    f.writelines(f"{key}\t{session_id}\n" for key, session_id in sessions.items())
+            path = os.path.join(self.directory, name)
+            np.save(path + ".tmp.npy", np.array(rows, dtype=ROW_DTYPE))
+            os.replace(path + ".tmp.npy", path)
+        if self.compact_segments:
+            compact(self.directory, self.compact_segments)
+        return len(rows)
+
+    def stats(self):
+        with self._lock:
+            buffered = len(self._rows)
+        return {
+            'directory': self.directory,
+            'segments': len(segment_names(self.directory)),
+            'buffered_rows': buffered
+        }
+
+
+def load_rows(directory):
+    """Every flushed row as one structured array, oldest segment first"""
+    # Shared lock: a concurrent compaction would otherwise show merged rows twice
+    with directory_lock(directory, exclusive=False):
+        segments = [np.load(os.path.join(directory, name), mmap_mode="r") for name in segment_names(directory)]
+    if not segments:
+        return np.empty(0, dtype=ROW_DTYPE)
+    return np.concatenate(segments)
+
+def load_session_names(directory):
+    names = {}
+    path = os.path.join(directory, SESSIONS_FILE)
+    if os.path.exists(path):
+        with open(path) as f:
+            for line in f:
+                key, _, session_id = line.rstrip("\n").partition("\t")
+                # Skip lines a crashed writer left half-written
+                if session_id and key.isdigit():
+                    names[int(key)] = session_id
+    return names
+
+
+def create_metrics_log():
+    """MetricsLog in METRICS_LOG_DIR, or None when the export is disabled"""
+    directory = os.getenv("METRICS_LOG_DIR")
+    if not directory:
+        return None
+    return MetricsLog(
+        directory,
+        flush_rows=int(os.getenv("METRICS_LOG_FLUSH_ROWS", "256")),
+        flush_seconds=float(os.getenv("METRICS_LOG_FLUSH_SECONDS", "30")),
+        compact_segments=int(os.getenv("METRICS_LOG_COMPACT_SEGMENTS", "16"))
+    )
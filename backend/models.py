@@ -0,0 +1,57 @@
+import os
+import threading
+
+
+class LazyModel:
+    """Defers building the client (and importing its SDK) until load() or the first call.
+
+    Call load() from a background thread at startup to keep imports off the request path.
+    """
+
+    def __init__(self, factory):
+        self._factory = factory
+        self._model = None
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self):
+        return self._model is not None
+
+    def load(self):
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    self._model = self._factory()
+        return self._model
+
+    def generate_content(self, *args, **kwargs):
+        return self.load().generate_content(*args, **kwargs)
+
+
+def build_gemini_model():
+    import google.generativeai as genai
+    # grpc does not cooperate with gevent workers; GEMINI_TRANSPORT=rest avoids it
+    genai.configure(
+        api_key=os.getenv("GEMINI_API_KEY"),
+        transport=os.getenv("GEMINI_TRANSPORT") or None
+    )
+    return genai.GenerativeModel(os.getenv("GEMINI_MODEL", "gemini-2.5-flash"))
+
+
+def create_model():
+    """Build the generative model selected by MODEL_BACKEND (gemini or fake)"""
+    backend = os.getenv("MODEL_BACKEND", "gemini")
+
+    if backend == "fake":
+        from fake_model import FakeGenerativeModel
+        return FakeGenerativeModel(
+            latency=float(os.getenv("FAKE_MODEL_LATENCY", "0.8")),
+            jitter=float(os.getenv("FAKE_MODEL_JITTER", "0")),
+            failure_rate=float(os.getenv("FAKE_MODEL_FAILURE_RATE", "0")),
+            stream_chunk_words=int(os.getenv("FAKE_MODEL_STREAM_CHUNK_WORDS", "4"))
+        )
+
+    if backend == "gemini":
+        return LazyModel(build_gemini_model)
+
+    raise ValueError(f"Unknown MODEL_BACKEND: {backend}")
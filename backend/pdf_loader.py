@@ -1,55 +1,80 @@
 import fitz  # PyMuPDF
-import re
+from chunking import MAX_TOKENS, MinHashDeduplicator, chunk_sentences
+import hashlib
+import time
 
-def extract_text_from_pdf(pdf_path):
-    """Extract text from PDF file"""
-    doc = fitz.open(pdf_path)
-    text = ""
+def iter_pages(pdf_path):
+    """Yield (page_number, text) one page at a time instead of building the whole document"""
+    with fitz.open(pdf_path) as doc:
+        for page_num, page in enumerate(doc):
+            yield page_num + 1, page.get_text()
+
+def chunk_pdf(pdf_path, category="general", source="pdf", max_tokens=MAX_TOKENS):
+    """Extract and chunk one PDF; runs in worker processes, so it must not touch the KB"""
+    start = time.perf_counter()
+    pages = 0
     
-    for page_num in range(len(doc)):
-        page = doc[page_num]
-        text += page.get_text()
+    def counted_pages():
+        nonlocal pages
+        for page in iter_pages(pdf_path):
+            pages += 1
+            yield page
     
-    doc.close()
-    return text
-
-def chunk_text(text, chunk_size=500, overlap=50):
-    """Split text into chunks for better retrieval"""
-    # Clean text - remove extra whitespace
-    text = re.sub(r'\s+', ' ', text).strip()
+    path_key = hashlib.sha1(pdf_path.encode("utf-8")).hexdigest()[:8]
+    ids, documents, metadatas = [], [], []
+    for i, chunk in enumerate(chunk_sentences(counted_pages(), max_tokens=max_tokens)):
+        ids.append(f"pdf_{category}_{path_key}_{i}")
+        documents.append(chunk["text"])
+        metadatas.append({
+            "category": category,
+            "type": "research",
+            "source": source,
+            "pdf_path": pdf_path,
+            "page_start": chunk["page_start"],
+            "page_end": chunk["page_end"],
+            "offset": chunk["offset"]
+        })
     
-    words = text.split()
-    chunks = []
+    return {
+        "path": pdf_path,
+        "pages": pages,
+        "ids": ids,
+        "documents": documents,
+        "metadatas": metadatas,
+        "seconds": time.perf_counter() - start
+    }
+
+def store_chunks(kb, chunked, batch_size=64, deduplicator=None):
+    """Sync one chunked PDF into the KB, embedding changed chunks in batches.
     
-    for i in range(0, len(words), chunk_size - overlap):
-        chunk = ' '.join(words[i:i + chunk_size])
-        if chunk:
-            chunks.append(chunk)
+    With a deduplicator, chunks already seen (in this PDF or earlier ones) are skipped.
+    Returns the number of chunks stored.
+    """
+    rows = list(zip(chunked["ids"], chunked["documents"], chunked["metadatas"]))
+    if deduplicator is not None:
+        rows = [row for row in rows if deduplicator.keep(row[1])]
+    ids = [doc_id for doc_id, _, _ in rows]
+    documents = [document for _, document, _ in rows]
+    metadatas = [metadata for _, _, metadata in rows]
     
-    return chunks
+    embedded = kb.sync_documents(
+        documents, metadatas, ids, group=f"pdf:{chunked['path']}", batch_size=batch_size
+    )
+    print(
+        f"✅ Synced {len(ids)} of {len(chunked['ids'])} chunks from {chunked['path']} "
+        f"({chunked['pages']} pages, {embedded} embedded)"
+    )
+    return len(ids)
 
-def load_pdf_to_knowledge_base(pdf_path, kb, category="general", source="pdf"):
+def load_pdf_to_knowledge_base(pdf_path, kb, category="general", source="pdf", batch_size=64):
     """Load PDF content into knowledge base"""
     print(f"📄 Loading PDF: {pdf_path}")
     
-    # Extract text
-    text = extract_text_from_pdf(pdf_path)
-    
-    # Split into chunks
-    chunks = chunk_text(text, chunk_size=500, overlap=50)
-    
-    print(f"📝 Created {len(chunks)} chunks from PDF")
-    
-    # Add to knowledge base
-    for i, chunk in enumerate(chunks):
-        doc_id = f"pdf_{category}_{i}"
-        metadata = {
-            "category": category,
-            "type": "research",
-            "source": source,
-            "pdf_path": pdf_path
-        }
-        kb.add_document(chunk, metadata, doc_id)
+    chunked = chunk_pdf(pdf_path, category=category, source=source)
+    print(f"📝 Created {len(chunked['ids'])} chunks from PDF")
     
-    print(f"✅ Added {len(chunks)} chunks to knowledge base")
-    return len(chunks)
\ No newline at end of file
+    # Add to knowledge base, re-embedding only chunks whose content changed
+    deduplicator = MinHashDeduplicator()
+    stored = store_chunks(kb, chunked, batch_size=batch_size, deduplicator=deduplicator)
+    print(f"♻️  Skipped {deduplicator.report()['embeddings_saved']} duplicate chunks")
+    return stored
\ No newline at end of file
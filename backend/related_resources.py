@@ -0,0 +1,62 @@
+"""Precompute related knowledge base entries for every resource topic and questionnaire category.
+
+Run from the backend directory:
+    python related_resources.py --output related_resources.json
+"""
+import argparse
+import json
+import time
+
+from kb import MentalHealthKnowledgeBase, build_filter
+
+# Article topics shown on the Resources page
+RESOURCE_TOPICS = [
+    "Understanding Stress: causes, symptoms, and practical strategies for managing stress",
+    "Grounding Techniques: simple methods to reduce anxiety by reconnecting with the present",
+    "Meditation for Beginners: start meditating with step-by-step guidance and tips",
+    "How to Build a Study Rhythm (Pomodoro): focused intervals and breaks to reduce overwhelm",
+    "Sleep Hygiene for Students: improve sleep quality with science-backed practices",
+    "Daily Mindfulness: accessible ways to add mindfulness to your day",
+    "4-7-8 Breathing Technique: a quick, calming practice to reduce stress and aid sleep",
+    "Box Breathing Guide: steady four-part breath to reduce anxiety and refocus",
+    "Mindful Walking Practice: guided mindful walk to reconnect with your senses",
+]
+
+# Sections of the questionnaire
+QUESTIONNAIRE_CATEGORIES = [
+    "Depression: low mood, loss of interest, hopelessness",
+    "Anxiety: feeling nervous, on edge, unable to relax",
+    "Stress: feeling unable to control important things, difficulties piling up",
+    "Loneliness and social isolation",
+    "Financial stress: worrying about making ends meet and budgeting",
+    "Academic motivation: procrastination and following through on study goals",
+]
+
+
+def precompute(kb, n_results=3, doc_type=None):
+    topics = RESOURCE_TOPICS + QUESTIONNAIRE_CATEGORIES
+    start = time.perf_counter()
+    results = kb.query_batch(topics, n_results=n_results, where=build_filter(doc_type=doc_type))
+    elapsed = time.perf_counter() - start
+    print(f"Queried {len(topics)} topics in {elapsed * 1000:.1f}ms")
+    return {
+        "resources": dict(zip(RESOURCE_TOPICS, results[:len(RESOURCE_TOPICS)])),
+        "questionnaire": dict(zip(QUESTIONNAIRE_CATEGORIES, results[len(RESOURCE_TOPICS):]))
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--output", default="related_resources.json")
+    parser.add_argument("--n-results", type=int, default=3)
+    parser.add_argument("--type", dest="doc_type", default=None, help="filter on the `type` metadata")
+    args = parser.parse_args()
+
+    related = precompute(MentalHealthKnowledgeBase(), n_results=args.n_results, doc_type=args.doc_type)
+    with open(args.output, "w") as f:
+        json.dump(related, f, indent=2)
+    print(f"Wrote {args.output}")
+
+
+if __name__ == "__main__":
+    main()
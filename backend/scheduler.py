@@ -0,0 +1,211 @@
+"""Central gate for outbound model calls.
+
+Every call waits for a token-bucket rate limit and a bounded concurrency slot. Waiters
+are served by priority (replies, then metrics, then history summaries), transient failures are retried with jittered
+exponential backoff, and identical prompts already in flight share one call.
+"""
+import hashlib
+import heapq
+import itertools
+import json
+import os
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from contextlib import contextmanager
+
+import telemetry
+
+PRIORITY_REPLY = 0
+PRIORITY_METRICS = 1
+PRIORITY_SUMMARY = 2
+PRIORITY_NAMES = {PRIORITY_REPLY: 'reply', PRIORITY_METRICS: 'metrics', PRIORITY_SUMMARY: 'summary'}
+
+
+def is_transient(error):
+    """Whether a failed call is worth retrying: rate limits, timeouts, 5xx and connection errors.
+
+    google.api_core errors (and FakeModelError) carry an HTTP status in `code`; anything
+    else, such as a blocked response or a bad API key, fails the same way on every attempt.
+    """
+    if isinstance(error, (ConnectionError, TimeoutError)):
+        return True
+    code = getattr(error, 'code', None)
+    return isinstance(code, int) and (code in (408, 429) or 500 <= code < 600)
+
+
+class TokenBucket:
+    """`rate` tokens per second up to `burst`; a rate of 0 disables limiting"""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.capacity = max(burst, 1)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+
+    def delay(self):
+        """Seconds until a token is available (0 when one is available now)"""
+        if not self.rate:
+            return 0.0
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self):
+        if self.rate:
+            self.tokens -= 1
+
+
+class ModelScheduler:
+    def __init__(self, model, rate=0.0, burst=10, max_concurrency=8, retries=2,
+                 backoff=0.5, backoff_max=8.0):
+        self.model = model
+        self.max_concurrency = max_concurrency
+        self.retries = retries
+        self.backoff = backoff
+        self.backoff_max = backoff_max
+
+        self._bucket = TokenBucket(rate, burst)
+        self._cond = threading.Condition()
+        self._waiting = []  # heap of (priority, sequence)
+        self._sequence = itertools.count()
+        self._active = 0
+        self._in_flight = {}  # prompt hash -> Future shared by coalesced callers
+        self._waits = {name: deque(maxlen=1000) for name in PRIORITY_NAMES.values()}
+        self._counters = {
+            'submitted': 0,
+            'completed': 0,
+            'failed': 0,
+            'retries': 0,
+            'coalesced': 0,
+            'rate_limited': 0,
+            'max_queue_depth': 0
+        }
+
+    def _acquire(self, priority):
+        ticket = (priority, next(self._sequence))
+        start = time.perf_counter()
+        with self._cond:
+            heapq.heappush(self._waiting, ticket)
+            self._counters['max_queue_depth'] = max(self._counters['max_queue_depth'], len(self._waiting))
+            limited = False
+            while True:
+                if self._waiting[0] == ticket and self._active < self.max_concurrency:
+                    delay = self._bucket.delay()
+                    if not delay:
+                        break
+                    limited = True
+                    self._cond.wait(delay)
+                else:
+                    self._cond.wait()
+            heapq.heappop(self._waiting)
+            self._bucket.take()
+            self._active += 1
+            if limited:
+                self._counters['rate_limited'] += 1
+            self._waits[PRIORITY_NAMES[priority]].append(time.perf_counter() - start)
+            # The next waiter may be able to go too
+            self._cond.notify_all()
+
+    def _release(self):
+        with self._cond:
+            self._active -= 1
+            self._cond.notify_all()
+
+    @contextmanager
+    def slot(self, priority=PRIORITY_REPLY):
+        """Hold a rate-limited concurrency slot, e.g. for the length of a streamed reply"""
+        self._acquire(priority)
+        try:
+            yield
+        finally:
+            self._release()
+
+    def _backoff_delay(self, attempt):
+        # Full jitter keeps retrying clients from synchronising into another burst
+        return random.uniform(0, min(self.backoff_max, self.backoff * 2 ** attempt))
+
+    def _call(self, prompt, priority, generation_config):
+        kwargs = {'generation_config': generation_config} if generation_config else {}
+        for attempt in range(self.retries + 1):
+            try:
+                with self.slot(priority):
+                    return self.model.generate_content(prompt, **kwargs).text
+            except Exception as e:
+                if attempt == self.retries or not is_transient(e):
+                    raise
+                with self._cond:
+                    self._counters['retries'] += 1
+                time.sleep(self._backoff_delay(attempt))
+
+    def generate(self, prompt, priority=PRIORITY_REPLY, generation_config=None):
+        """Return the model's text for `prompt`, sharing the call with identical in-flight prompts"""
+        # Exact prompt, not the normalized cache hash: prompts differing only in case or
+        # whitespace are different requests
+        key = hashlib.sha256(
+            f"{json.dumps(generation_config, sort_keys=True)}\x00{prompt}".encode("utf-8")
+        ).hexdigest()
+        with self._cond:
+            self._counters['submitted'] += 1
+            shared = self._in_flight.get(key)
+            if shared is None:
+                future = self._in_flight[key] = Future()
+            else:
+                self._counters['coalesced'] += 1
+        if shared is not None:
+            return shared.result()
+
+        try:
+            text = self._call(prompt, priority, generation_config)
+            future.set_result(text)
+            return text
+        except Exception as e:
+            future.set_exception(e)
+            telemetry.inc('model_errors_total', call=PRIORITY_NAMES[priority])
+            raise
+        finally:
+            with self._cond:
+                del self._in_flight[key]
+                self._counters['completed' if future.exception() is None else 'failed'] += 1
+
+    def stats(self):
+        with self._cond:
+            counters = dict(self._counters)
+            waits = {name: sorted(values) for name, values in self._waits.items()}
+            queue_depth = len(self._waiting)
+            active = self._active
+        wait_stats = {}
+        for name, values in waits.items():
+            if not values:
+                wait_stats[name] = {'count': 0}
+                continue
+            wait_stats[name] = {
+                'count': len(values),
+                'avg_ms': sum(values) / len(values) * 1000,
+                'p95_ms': values[min(len(values) - 1, int(len(values) * 0.95))] * 1000,
+                'max_ms': values[-1] * 1000
+            }
+        return {
+            'queue_depth': queue_depth,
+            'active': active,
+            'max_concurrency': self.max_concurrency,
+            'rate_per_second': self._bucket.rate,
+            'wait': wait_stats,
+            **counters
+        }
+
+
+def create_scheduler(model):
+    """Build the scheduler from MODEL_RATE_LIMIT, MODEL_BURST, MODEL_MAX_CONCURRENCY and MODEL_RETRIES"""
+    return ModelScheduler(
+        model,
+        rate=float(os.getenv("MODEL_RATE_LIMIT", "0")),
+        burst=int(os.getenv("MODEL_BURST", "10")),
+        max_concurrency=int(os.getenv("MODEL_MAX_CONCURRENCY", "8")),
+        retries=int(os.getenv("MODEL_RETRIES", "2")),
+        backoff=float(os.getenv("MODEL_BACKOFF", "0.5")),
+        backoff_max=float(os.getenv("MODEL_BACKOFF_MAX", "8"))
+    )
@@ -0,0 +1,127 @@
+"""Questionnaire scoring driven by a declarative scale table.
+
+Item ids are `<prefix><number>` (e.g. `phq2`). Each scale lists its answer range, the
+average that triggers a concern and which items are positively worded (reverse-scored).
+"""
+import re
+
+import numpy as np
+
+SCALES = [
+    {"key": "phq", "label": "Depression concerns", "short": "PHQ", "max": 3,
+     "threshold": 2, "direction": "high", "reverse": []},
+    {"key": "ghq", "label": "Anxiety concerns", "short": "GHQ", "max": 3,
+     "threshold": 2, "direction": "high", "reverse": []},
+    {"key": "pss", "label": "Stress concerns", "short": "PSS", "max": 3,
+     "threshold": 2, "direction": "high", "reverse": []},
+    # "I feel in tune with the people around me", "There are people I can talk to"
+    {"key": "ucla", "label": "Social isolation concerns", "short": "UCLA", "max": 4,
+     "threshold": 3, "direction": "high", "reverse": ["ucla1", "ucla3"]},
+    # "I feel confident in my budgeting"
+    {"key": "fin", "label": "Financial stress concerns", "short": "Score", "max": 4,
+     "threshold": 3, "direction": "high", "reverse": ["fin3"]},
+    # "I procrastinate on assignments"
+    {"key": "acad", "label": "Low academic motivation", "short": "Score", "max": 4,
+     "threshold": 2, "direction": "low", "reverse": ["acad3"]},
+]
+
+SCALES_BY_PREFIX = {scale["key"]: scale for scale in SCALES}
+REVERSE_ITEMS = {item for scale in SCALES for item in scale["reverse"]}
+ITEM_PREFIX = re.compile(r'^([a-z]+)')
+
+NO_CONCERNS = "No significant concerns identified"
+
+def scale_for(item_id):
+    match = ITEM_PREFIX.match(str(item_id).lower())
+    return SCALES_BY_PREFIX.get(match.group(1)) if match else None
+
+def is_flagged(scale, average):
+    if scale["direction"] == "low":
+        return average <= scale["threshold"]
+    return average >= scale["threshold"]
+
+def score_responses(responses):
+    """Score one submission in a single pass over its answers"""
+    totals = {}
+    for item_id, value in responses.items():
+        scale = scale_for(item_id)
+        if scale is None or not isinstance(value, (int, float)):
+            continue
+        if item_id in REVERSE_ITEMS:
+            value = scale["max"] - value
+        total, count = totals.get(scale["key"], (0, 0))
+        totals[scale["key"]] = (total + value, count + 1)
+
+    scores = {}
+    for scale in SCALES:
+        if scale["key"] not in totals:
+            continue
+        total, count = totals[scale["key"]]
+        average = total / count
+        scores[scale["key"]] = {
+            "average": average,
+            "items": count,
+            "flagged": is_flagged(scale, average)
+        }
+    return scores
+
+def build_context(scores):
+    """Prompt-ready summary of the flagged scales, in scale order"""
+    parts = [
+        f"{scale['label']} ({scale['short']}: {scores[scale['key']]['average']:.1f}/{scale['max']})"
+        for scale in SCALES
+        if scale["key"] in scores and scores[scale["key"]]["flagged"]
+    ]
+    return " | ".join(parts) if parts else NO_CONCERNS
+
+def score_submission(responses):
+    """Scores and context string, computed once when a questionnaire is saved"""
+    scores = score_responses(responses)
+    return scores, build_context(scores)
+
+def score_cohort(submissions):
+    """Vectorised scoring for many users at once (cohort exports).
+
+    `submissions` maps user id -> responses dict. Returns user ids, scale keys, an
+    (users x scales) array of averages (NaN where a scale was not answered) and a
+    matching boolean array of flags.
+    """
+    user_ids = list(submissions)
+    columns = sorted({
+        item_id for responses in submissions.values() for item_id in responses if scale_for(item_id)
+    })
+    column_index = {item_id: i for i, item_id in enumerate(columns)}
+
+    answers = np.full((len(user_ids), len(columns)), np.nan)
+    for row, user_id in enumerate(user_ids):
+        for item_id, value in submissions[user_id].items():
+            column = column_index.get(item_id)
+            if column is not None and isinstance(value, (int, float)):
+                answers[row, column] = value
+
+    column_scales = [SCALES.index(scale_for(item_id)) for item_id in columns]
+    maxima = np.array([SCALES[s]["max"] for s in column_scales], dtype=float)
+    reverse = np.array([item_id in REVERSE_ITEMS for item_id in columns], dtype=bool)
+    answers = np.where(reverse, maxima - answers, answers)
+
+    answered = ~np.isnan(answers)
+    values = np.where(answered, answers, 0.0)
+    membership = np.zeros((len(columns), len(SCALES)))
+    membership[np.arange(len(columns)), column_scales] = 1
+
+    totals = values @ membership
+    counts = answered.astype(float) @ membership
+    with np.errstate(invalid="ignore", divide="ignore"):
+        averages = np.where(counts > 0, totals / counts, np.nan)
+
+    thresholds = np.array([scale["threshold"] for scale in SCALES], dtype=float)
+    low = np.array([scale["direction"] == "low" for scale in SCALES])
+    with np.errstate(invalid="ignore"):
+        flags = np.where(low, averages <= thresholds, averages >= thresholds) & ~np.isnan(averages)
+
+    return {
+        "user_ids": user_ids,
+        "scales": [scale["key"] for scale in SCALES],
+        "averages": averages,
+        "flags": flags
+    }
@@ -1,22 +1,184 @@
+import atexit
+import logging
 import os
 import json
-from flask import Flask, request, jsonify
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from flask import Blueprint, Flask, Response, g, request, jsonify, stream_with_context
 from flask_cors import CORS
 from dotenv import load_dotenv
-import google.generativeai as genai
+from models import create_model
+from scheduler import PRIORITY_METRICS, PRIORITY_REPLY, PRIORITY_SUMMARY, create_scheduler
+from history import create_history_manager
+from structured import (
+    JSON_OUTPUT, METRIC_KEYS, build_combined_prompt, build_repair_prompt, parse_json_block, validate_metrics,
+    validate_turn
+)
+from sessions import create_session_store
+from cache import create_response_cache
+from metrics_log import create_metrics_log, load_rows, load_session_names
+import analytics
+import telemetry
+from scoring import score_cohort, score_submission
+import numpy as np
 
 load_dotenv()
-GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 
-genai.configure(api_key=GEMINI_API_KEY)
-model = genai.GenerativeModel('gemini-2.5-flash')
+# DEBUG adds per-request detail; WARNING keeps the hot path quiet
+logging.basicConfig(
+    level=os.getenv("LOG_LEVEL", "INFO").upper(),
+    format="%(asctime)s %(levelname)s %(name)s: %(message)s"
+)
+logger = logging.getLogger("mindly")
 
-app = Flask(__name__)
-CORS(app) 
+# sequential: metrics then reply, parallel: both at once,
+# deferred: reply returned immediately, metrics land later in /api/metrics/<session_id>
+CHAT_MODE = os.getenv("CHAT_MODE", "parallel")
+METRICS_TIMEOUT = float(os.getenv("METRICS_TIMEOUT", "20"))
+REPLY_TIMEOUT = float(os.getenv("REPLY_TIMEOUT", "30"))
+REPLY_TIMEOUT_MESSAGE = "[Error] The response took too long. Please try again."
+TIMED_OUT = object()  # wait_for() fallback that tells a timeout apart from a None result
+MODEL_WORKERS = int(os.getenv("MODEL_WORKERS", "8"))
+# split: separate reply and metrics calls, combined: one structured call returning both
+# (falls back to split when the output cannot be validated or repaired)
+GENERATION_MODE = os.getenv("GENERATION_MODE", "split")
 
-user_sessions = {}
+# Optional retrieval-augmented generation over the shared knowledge base
+RAG_ENABLED = os.getenv("RAG_ENABLED", "0") == "1"
+RAG_TOP_K = int(os.getenv("RAG_TOP_K", "3"))
+# Retrieval is skipped for the turn once embedding + query exceed this budget
+RAG_BUDGET_MS = float(os.getenv("RAG_BUDGET_MS", "150"))
+
+# The knowledge base is also served on its own through /api/kb/query
+KB_ENABLED = RAG_ENABLED or os.getenv("KB_ENABLED", "0") == "1"
+KB_MAX_BATCH = int(os.getenv("KB_MAX_BATCH", "256"))
+# Build the model client and knowledge base on a background thread so the worker can
+# accept traffic at once (RAG is skipped and /api/ready reports 503 until they are warm)
+BACKGROUND_WARMUP = os.getenv("BACKGROUND_WARMUP", "1") == "1"
+if KB_ENABLED:
+    from kb import MentalHealthKnowledgeBase, build_filter
+
+# Metrics are near-deterministic and always cached; reply caching trades variety for cost
+CACHE_REPLIES = os.getenv("CACHE_REPLIES", "0") == "1"
+
+# Exposes /api/debug/profile, a wall-clock stack sampler over all threads
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "0") == "1"
+profiler = telemetry.StackSampler()
+
+# Per-process resources, built once by init_resources(); under gunicorn that is once per worker
+model = None
+scheduler = None
+model_executor = None
+session_store = None
+history_manager = None
+response_cache = None
+metrics_log = None
+knowledge_base = None
+retrieval_executor = None
+
+resources_lock = threading.Lock()
+readiness = {
+    'model': False,
+    'knowledge_base': None if not KB_ENABLED else False,
+    'shutting_down': False
+}
+
+api = Blueprint('api', __name__)
+
+def init_resources():
+    """Create the model client, stores, caches and knowledge base for this process"""
+    global model, scheduler, model_executor, session_store, history_manager, response_cache
+    global metrics_log, knowledge_base, retrieval_executor
+    with resources_lock:
+        if model is not None:
+            return
+
+        # MODEL_BACKEND=fake swaps in an offline stand-in for benchmarks and load tests
+        model = create_model()
+        # Rate limit, concurrency cap, priorities and retries for every outbound call
+        scheduler = create_scheduler(model)
+        model_executor = ThreadPoolExecutor(max_workers=MODEL_WORKERS, thread_name_prefix="model")
+        session_store = create_session_store()
+        history_manager = create_history_manager(
+            session_store,
+            lambda prompt: scheduler.generate(prompt, PRIORITY_SUMMARY),
+            model_executor
+        )
+        response_cache = create_response_cache()
+        # Columnar per-turn export for /api/analytics/cohort (off unless METRICS_LOG_DIR is set)
+        metrics_log = create_metrics_log()
+        if KB_ENABLED:
+            retrieval_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="retrieval")
+
+        for name, source in (
+            ('response_cache', response_cache), ('scheduler', scheduler),
+            ('sessions', session_store), ('history', history_manager)
+        ):
+            telemetry.registry.register_collector(telemetry.stats_collector(name, source.stats))
+
+        if BACKGROUND_WARMUP:
+            threading.Thread(target=warm_up, name="warm-up", daemon=True).start()
+        else:
+            warm_up()
+
+def warm_up():
+    """Import and build the heavy pieces: the model SDK, then the knowledge base"""
+    global knowledge_base
+    start = time.perf_counter()
+    try:
+        if hasattr(model, 'load'):
+            model.load()
+        readiness['model'] = True
+        logger.info("Model client ready in %.2fs", time.perf_counter() - start)
+
+        if KB_ENABLED:
+            kb = MentalHealthKnowledgeBase()
+            # Load the embedding model now rather than on the first user's budget
+            kb.embed_query("warm up")
+            knowledge_base = kb
+            readiness['knowledge_base'] = True
+            logger.info("Knowledge base ready in %.2fs", time.perf_counter() - start)
+    except Exception:
+        logger.exception("Warm-up failed; /api/ready stays unavailable")
+        if BACKGROUND_WARMUP:
+            return
+        raise
+
+def shutdown_resources(wait=True):
+    """Stop taking work and let in-flight model calls (including deferred metrics) finish"""
+    readiness['shutting_down'] = True
+    for executor in (model_executor, retrieval_executor):
+        if executor is not None:
+            executor.shutdown(wait=wait, cancel_futures=not wait)
+    if metrics_log is not None:
+        metrics_log.flush()
+
+atexit.register(shutdown_resources)
+
+def create_app():
+    """Application factory used by the dev server, wsgi.py and the benchmarks"""
+    init_resources()
+    app = Flask(__name__)
+    CORS(app)
+    app.register_blueprint(api)
+    return app
+
+DEFAULT_METRICS = {
+    "stress": 5,
+    "anxiety": 5,
+    "loneliness": 5,
+    "motivation": 5,
+    "financial_burden": 5,
+    "academic_pressure": 5
+}
+
+def extract_metrics(user_message, conversation_history, embedding=None):
+    """Returns (metrics, fallback); fallback is True when the defaults stand in for a failed call"""
+    cached = response_cache.get('metrics', user_message, scope=conversation_history, embedding=embedding)
+    if cached is not None:
+        return dict(cached), False
 
-def extract_metrics(user_message, conversation_history):
     try:
         metrics_prompt = f"""Analyze the following conversation and rate these metrics on a scale of 0-10:
     - Stress Level (0=calm, 10=extremely stressed)
@@ -36,38 +198,37 @@ def extract_metrics(user_message, conversation_history):
 
     JSON Response:"""
         
-        response = model.generate_content(metrics_prompt)
-        metrics_text = response.text.strip()
-        if "```json" in metrics_text:
-            metrics_text = metrics_text.split("```json")[1].split("```")[0].strip()
-        elif "```" in metrics_text:
-            metrics_text = metrics_text.split("```")[1].split("```")[0].strip()
-        
-        metrics = json.loads(metrics_text)
-        return metrics
+        with telemetry.timed('metrics_call'):
+            metrics_text = scheduler.generate(metrics_prompt, PRIORITY_METRICS)
+        metrics = validate_metrics(parse_json_block(metrics_text))
+        response_cache.set(
+            'metrics', user_message, metrics, scope=conversation_history, embedding=embedding
+        )
+        return dict(metrics), False
     except Exception as e:
-        print(f"Error extracting metrics: {e}")
-        return {
-            "stress": 5,
-            "anxiety": 5,
-            "loneliness": 5,
-            "motivation": 5,
-            "financial_burden": 5,
-            "academic_pressure": 5
-        }
+        logger.warning("Error extracting metrics: %s", e)
+        telemetry.inc('fallbacks_total', kind='default_metrics')
+        return dict(DEFAULT_METRICS), True
 
-def get_ai_response(user_message, conversation_history="", questionnaire_context=""):
-    try:
-        context_section = ""
-        if questionnaire_context:
-            context_section = f"""
+def build_reply_prompt(user_message, conversation_history="", questionnaire_context="",
+                       knowledge_context=""):
+    context_section = ""
+    if questionnaire_context:
+        context_section = f"""
 ### User's Assessment Results:
 {questionnaire_context}
 
 Based on this assessment, provide targeted support and coping strategies for their specific concerns. Focus on practical, actionable advice.
 """
-        
-        prompt = f"""You are Mindly, a supportive mental health assistant for students. Be warm, empathetic, and helpful.
+    if knowledge_context:
+        context_section += f"""
+### Relevant Knowledge:
+{knowledge_context}
+
+Draw on this material where it fits the user's situation, in your own words.
+"""
+    
+    prompt = f"""You are Mindly, a supportive mental health assistant for students. Be warm, empathetic, and helpful.
 
 Guidelines:
 - Listen without judgment and acknowledge their feelings
@@ -77,18 +238,173 @@ Guidelines:
 - If they need professional help, suggest reaching out to a counselor
 
 {context_section}
-        
+    
 Previous conversation: {conversation_history}
 Current message: {user_message}
 
 Respond with care and practical guidance."""
-        
-        response = model.generate_content(prompt)
-        return response.text
+    return prompt
+
+def reply_cache_scope(conversation_history, questionnaire_context, knowledge_context):
+    return f"{questionnaire_context}\n{knowledge_context}\n{conversation_history}"
+
+def get_ai_response(user_message, conversation_history="", questionnaire_context="",
+                    knowledge_context="", embedding=None):
+    scope = reply_cache_scope(conversation_history, questionnaire_context, knowledge_context)
+    if CACHE_REPLIES:
+        cached = response_cache.get('reply', user_message, scope=scope, embedding=embedding)
+        if cached is not None:
+            return cached
+
+    try:
+        prompt = build_reply_prompt(
+            user_message, conversation_history, questionnaire_context, knowledge_context
+        )
+        with telemetry.timed('reply_call'):
+            text = scheduler.generate(prompt, PRIORITY_REPLY)
+        if CACHE_REPLIES:
+            response_cache.set('reply', user_message, text, scope=scope, embedding=embedding)
+        return text
     except Exception as e:
+        logger.warning("Error generating reply: %s", e)
+        telemetry.inc('fallbacks_total', kind='error_reply')
         return f"[Error] {str(e)}"
 
-@app.route('/api/chat', methods=['POST'])
+def generate_turn(user_message, conversation_history="", questionnaire_context="",
+                  knowledge_context="", embedding=None):
+    """Reply and metrics from one structured call; None when the caller should use two calls.
+
+    Output that fails validation gets one repair attempt with the error fed back.
+    """
+    if response_cache.contains('metrics', user_message, scope=conversation_history, embedding=embedding):
+        # Metrics are already cached, so the split path costs a single call anyway
+        return None
+
+    prompt = build_combined_prompt(build_reply_prompt(
+        user_message, conversation_history, questionnaire_context, knowledge_context
+    ))
+    for attempt in range(2):
+        try:
+            with telemetry.timed('combined_call'):
+                output = scheduler.generate(prompt, PRIORITY_REPLY, generation_config=JSON_OUTPUT)
+        except Exception as e:
+            logger.warning("Combined generation failed: %s", e)
+            telemetry.inc('fallbacks_total', kind='combined_to_split')
+            return None
+        try:
+            reply, metrics = validate_turn(parse_json_block(output))
+        except ValueError as e:
+            logger.info("Combined generation rejected: %s", e)
+            telemetry.inc('fallbacks_total', kind='combined_repair')
+            prompt = build_repair_prompt(prompt, output, e)
+            continue
+
+        response_cache.set('metrics', user_message, metrics, scope=conversation_history, embedding=embedding)
+        if CACHE_REPLIES:
+            scope = reply_cache_scope(conversation_history, questionnaire_context, knowledge_context)
+            response_cache.set('reply', user_message, reply, scope=scope, embedding=embedding)
+        return reply, metrics
+    telemetry.inc('fallbacks_total', kind='combined_to_split')
+    return None
+
+def stream_ai_response(user_message, conversation_history="", questionnaire_context="",
+                       knowledge_context="", embedding=None):
+    """Yield reply text chunks as the model produces them"""
+    scope = reply_cache_scope(conversation_history, questionnaire_context, knowledge_context)
+    if CACHE_REPLIES:
+        cached = response_cache.get('reply', user_message, scope=scope, embedding=embedding)
+        if cached is not None:
+            yield cached
+            return
+
+    try:
+        prompt = build_reply_prompt(
+            user_message, conversation_history, questionnaire_context, knowledge_context
+        )
+        chunks = []
+        with scheduler.slot(PRIORITY_REPLY), telemetry.timed('reply_stream'):
+            for chunk in model.generate_content(prompt, stream=True):
+                if chunk.text:
+                    chunks.append(chunk.text)
+                    yield chunk.text
+        if CACHE_REPLIES:
+            response_cache.set(
+                'reply', user_message, "".join(chunks), scope=scope, embedding=embedding
+            )
+    except Exception as e:
+        logger.warning("Error streaming reply: %s", e)
+        telemetry.inc('model_errors_total', call='reply_stream')
+        telemetry.inc('fallbacks_total', kind='error_reply')
+        yield f"[Error] {str(e)}"
+
+def retrieve_knowledge(user_message, timer):
+    """Embed the message once and fetch top-k chunks within RAG_BUDGET_MS.
+
+    Returns (knowledge_context, embedding); either may be empty when the budget runs out.
+    """
+    if knowledge_base is None:
+        return "", None
+
+    deadline = time.perf_counter() + RAG_BUDGET_MS / 1000
+    with timer.stage('embed'):
+        future = retrieval_executor.submit(knowledge_base.embed_query, user_message)
+        embedding = wait_for(future, RAG_BUDGET_MS / 1000, None, "Query embedding")
+    if embedding is None:
+        return "", None
+
+    with timer.stage('retrieve'):
+        future = retrieval_executor.submit(knowledge_base.query_by_embedding, embedding, RAG_TOP_K)
+        documents = wait_for(future, max(deadline - time.perf_counter(), 0), [], "Retrieval")
+    return "\n\n".join(documents), embedding
+
+def wait_for(future, timeout, fallback, label):
+    """Wait for a model call, cancelling it and returning fallback on timeout"""
+    try:
+        return future.result(timeout=timeout)
+    except FutureTimeoutError:
+        future.cancel()
+        logger.warning("%s timed out after %ss", label, timeout)
+        telemetry.inc('fallbacks_total', kind=f"{label.lower().replace(' ', '_')}_timeout")
+        return fallback
+
+def record_metrics(session_id, turn, user_message, metrics, fallback=False):
+    session_store.append_metrics(session_id, {
+        'timestamp': turn,
+        'metrics': metrics,
+        'message': user_message
+    })
+    if metrics_log is not None:
+        metrics_log.append(session_id, turn, metrics, fallback=fallback)
+
+def record_deferred_metrics(session_id, turn, user_message, future):
+    if future.cancelled():
+        metrics, fallback = dict(DEFAULT_METRICS), True
+    else:
+        metrics, fallback = future.result()
+    record_metrics(session_id, turn, user_message, metrics, fallback)
+
+def store_exchange(session_id, user_message, bot_response):
+    session_store.append_exchange(session_id, user_message, bot_response)
+    history_manager.maybe_summarize(session_id)
+
+def finish_turn(session_id, turn, user_message, bot_response, metrics_future):
+    """Store the exchange and resolve metrics according to CHAT_MODE"""
+    store_exchange(session_id, user_message, bot_response)
+
+    if CHAT_MODE == 'deferred':
+        metrics_future.add_done_callback(
+            lambda f: record_deferred_metrics(session_id, turn, user_message, f)
+        )
+        return None
+
+    metrics, fallback = wait_for(metrics_future, METRICS_TIMEOUT, (dict(DEFAULT_METRICS), True), "Metrics")
+    record_metrics(session_id, turn, user_message, metrics, fallback)
+    return metrics
+
+def sse_event(event, payload):
+    return f"event: {event}\ndata: {json.dumps(payload)}\n\n"
+
+@api.route('/api/chat', methods=['POST'])
 def chat():
     data = request.json
     user_message = data.get('message', '')
@@ -98,63 +414,207 @@ def chat():
     if not user_message.strip():
         return jsonify({'error': 'Empty message'}), 400
     
-    if session_id not in user_sessions:
-        user_sessions[session_id] = {
-            'history': [],
-            'metrics_history': []
-        }
+    timer = telemetry.stage_timer()
+    session, turn = session_store.start_turn(session_id)
+    with timer.stage('history'):
+        conversation_history = history_manager.render(session_id, session)
 
-    session = user_sessions[session_id]
-    conversation_history = "\n".join([
-        f"{'User' if i % 2 == 0 else 'Bot'}: {msg}" 
-        for i, msg in enumerate(session['history'][-6:])
-    ])
+    with timer.stage('questionnaire'):
+        questionnaire_context = get_questionnaire_context(user_id) if user_id else ""
+    knowledge_context, embedding = retrieve_knowledge(user_message, timer)
 
-    questionnaire_context = get_questionnaire_context(user_id) if user_id else ""
+    with timer.stage('model'):
+        # One reply budget per turn, shared by the combined call and any split fallback
+        reply_deadline = time.perf_counter() + REPLY_TIMEOUT
+        combined = None
+        if GENERATION_MODE == 'combined':
+            combined = wait_for(
+                model_executor.submit(
+                    generate_turn, user_message, conversation_history, questionnaire_context,
+                    knowledge_context, embedding
+                ),
+                REPLY_TIMEOUT, TIMED_OUT, "Combined generation"
+            )
 
-    metrics = extract_metrics(user_message, conversation_history)
+        if combined is TIMED_OUT:
+            # The provider is already slow; a second full attempt would only double the wait
+            bot_response, metrics = REPLY_TIMEOUT_MESSAGE, dict(DEFAULT_METRICS)
+            store_exchange(session_id, user_message, bot_response)
+            record_metrics(session_id, turn, user_message, metrics, fallback=True)
+        elif combined is not None:
+            bot_response, metrics = combined
+            store_exchange(session_id, user_message, bot_response)
+            record_metrics(session_id, turn, user_message, metrics)
+        elif CHAT_MODE == 'sequential':
+            metrics, fallback = extract_metrics(user_message, conversation_history, embedding)
+            bot_response = get_ai_response(
+                user_message, conversation_history, questionnaire_context, knowledge_context, embedding
+            )
+            store_exchange(session_id, user_message, bot_response)
+            record_metrics(session_id, turn, user_message, metrics, fallback)
+        else:
+            metrics_future = model_executor.submit(
+                extract_metrics, user_message, conversation_history, embedding
+            )
+            reply_future = model_executor.submit(
+                get_ai_response, user_message, conversation_history, questionnaire_context,
+                knowledge_context, embedding
+            )
+            bot_response = wait_for(
+                reply_future, max(reply_deadline - time.perf_counter(), 0), REPLY_TIMEOUT_MESSAGE, "Reply"
+            )
+            metrics = finish_turn(session_id, turn, user_message, bot_response, metrics_future)
     
-    bot_response = get_ai_response(user_message, conversation_history, questionnaire_context)
-    
-    session['history'].append(user_message)
-    session['history'].append(bot_response)
-    session['metrics_history'].append({
-        'timestamp': len(session['metrics_history']),
+    response = jsonify({
+        'response': bot_response,
         'metrics': metrics,
-        'message': user_message
+        'metrics_pending': metrics is None
     })
-    
+    response.headers['Server-Timing'] = timer.header()
+    return response
+
+@api.route('/api/chat/stream', methods=['POST'])
+def chat_stream():
+    """Server-sent events: `chunk` events with reply text, then one `done` event with metrics"""
+    data = request.json
+    user_message = data.get('message', '')
+    session_id = data.get('session_id', 'default')
+    user_id = data.get('user_id')
+
+    if not user_message.strip():
+        return jsonify({'error': 'Empty message'}), 400
+
+    timer = telemetry.stage_timer()
+    session, turn = session_store.start_turn(session_id)
+    with timer.stage('history'):
+        conversation_history = history_manager.render(session_id, session)
+
+    with timer.stage('questionnaire'):
+        questionnaire_context = get_questionnaire_context(user_id) if user_id else ""
+    knowledge_context, embedding = retrieve_knowledge(user_message, timer)
+
+    # Metrics run alongside the stream so they are usually ready by the last chunk
+    metrics_future = model_executor.submit(
+        extract_metrics, user_message, conversation_history, embedding
+    )
+
+    def generate():
+        chunks = []
+        finished = False
+        stream = stream_ai_response(
+            user_message, conversation_history, questionnaire_context, knowledge_context, embedding
+        )
+        try:
+            for text in stream:
+                chunks.append(text)
+                yield sse_event('chunk', {'text': text})
+
+            bot_response = "".join(chunks)
+            finished = True
+            metrics = finish_turn(session_id, turn, user_message, bot_response, metrics_future)
+            yield sse_event('done', {
+                'response': bot_response,
+                'metrics': metrics,
+                'metrics_pending': metrics is None
+            })
+        finally:
+            if not finished:
+                # Client disconnected mid-stream: keep the partial reply and still record the
+                # turn's metrics, without blocking the closing worker on the model
+                stream.close()
+                store_exchange(session_id, user_message, "".join(chunks))
+                metrics_future.add_done_callback(
+                    lambda f: record_deferred_metrics(session_id, turn, user_message, f)
+                )
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        # Stages before the first byte only; model time is visible in the stream itself
+        headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no',
+            'Server-Timing': timer.header()
+        }
+    )
+
+@api.route('/api/kb/query', methods=['POST'])
+def kb_query():
+    """Batch retrieval: {"queries": [...], "n_results": 3, "category": ..., "type": ...}"""
+    if knowledge_base is None:
+        message = 'Knowledge base is loading' if KB_ENABLED else 'Knowledge base is not enabled'
+        return jsonify({'error': message}), 503
+
+    data = request.json or {}
+    queries = data.get('queries')
+    if not isinstance(queries, list) or not queries or not all(isinstance(q, str) for q in queries):
+        return jsonify({'error': 'queries must be a non-empty list of strings'}), 400
+    if len(queries) > KB_MAX_BATCH:
+        return jsonify({'error': f'At most {KB_MAX_BATCH} queries per request'}), 400
+
+    try:
+        n_results = int(data.get('n_results', 3))
+    except (TypeError, ValueError):
+        return jsonify({'error': 'n_results must be an integer'}), 400
+
+    try:
+        with telemetry.timed('kb_query'):
+            results = knowledge_base.query_batch(
+                queries,
+                n_results=max(1, min(n_results, 20)),
+                where=build_filter(data.get('category'), data.get('type'))
+            )
+    except Exception as e:
+        logger.error("Error querying knowledge base: %s", e)
+        return jsonify({'error': str(e)}), 500
+
     return jsonify({
-        'response': bot_response,
-        'metrics': metrics  
+        'results': [{'query': query, 'matches': matches} for query, matches in zip(queries, results)]
     })
 
-@app.route('/api/metrics/<session_id>', methods=['GET'])
+@api.route('/api/metrics/<session_id>', methods=['GET'])
 def get_metrics(session_id):
-    if session_id not in user_sessions:
+    """Running aggregates plus history; `since=<seq>` and `limit=<n>` page the history"""
+    since = request.args.get('since', type=int)
+    limit = request.args.get('limit', type=int)
+    if limit is not None and limit < 0:
+        return jsonify({'error': 'limit must be non-negative'}), 400
+
+    result = session_store.get_metrics(session_id, since=since, limit=limit)
+    if result is None:
         return jsonify({'error': 'Session not found'}), 404
-    
-    metrics_history = user_sessions[session_id]['metrics_history']
-    
-    if metrics_history:
-        latest = metrics_history[-1]['metrics']
-        avg_metrics = {
-            key: sum(m['metrics'][key] for m in metrics_history) / len(metrics_history)
-            for key in latest.keys()
-        }
-    else:
-        latest = {}
-        avg_metrics = {}
-    
-    return jsonify({
-        'latest': latest,
-        'average': avg_metrics,
-        'history': metrics_history
-    })
 
-questionnaire_data = {}
+    history = result['history']
+    # Records can arrive out of turn order (deferred metrics), so the cursor is the record seq
+    result['next_since'] = max((m['seq'] for m in history), default=since)
+    return jsonify(result)
 
-@app.route('/api/questionnaire/latest', methods=['POST'])
+@api.route('/api/analytics/cohort', methods=['GET'])
+def cohort_analytics():
+    """Percentiles, daily distribution, rising `metric` and at-risk sessions over the last `days`"""
+    if metrics_log is None:
+        return jsonify({'error': 'Metrics log is not enabled (set METRICS_LOG_DIR)'}), 503
+
+    metric = request.args.get('metric', 'anxiety')
+    if metric not in METRIC_KEYS:
+        return jsonify({'error': f"metric must be one of {', '.join(METRIC_KEYS)}"}), 400
+    days = max(1, min(request.args.get('days', 7, type=int), 365))
+    k = max(1, min(request.args.get('k', 10, type=int), 100))
+    min_turns = max(2, request.args.get('min_turns', 3, type=int))
+
+    # Buffered rows (in any worker) show up after that worker's next flush; flushing here
+    # would write a new segment for every dashboard poll
+    now = time.time()
+    report = analytics.cohort_report(
+        load_rows(metrics_log.directory), since=now - days * analytics.DAY, metric=metric,
+        k=k, min_turns=min_turns, days=days, now=now
+    )
+    names = load_session_names(metrics_log.directory)
+    for entry in report['trending_up'] + report['at_risk']:
+        entry['session'] = names.get(entry['session'], str(entry['session']))
+    return jsonify(report)
+
+@api.route('/api/questionnaire/latest', methods=['POST'])
 def save_questionnaire():
     try:
         data = request.json
@@ -162,93 +622,142 @@ def save_questionnaire():
         timestamp = data.get('timestamp')
         responses = data.get('responses', {})
         
-        print(f"DEBUG: Saving questionnaire data for user {user_id}")
-        print(f"DEBUG: Responses: {responses}")
-        
-        questionnaire_data[user_id] = {
+        # Answers are sensitive; log their shape, never their values
+        logger.debug("Saving questionnaire for user %s (%d responses)", user_id, len(responses))
+
+        scores, context = score_submission(responses)
+        session_store.save_questionnaire(user_id, {
             'timestamp': timestamp,
-            'responses': responses
-        }
-        
-        print(f"DEBUG: Total users stored: {len(questionnaire_data)}")
+            'responses': responses,
+            'scores': scores,
+            'context': context
+        })
         
         return jsonify({'saved': True, 'message': 'Questionnaire data saved'})
     except Exception as e:
-        print(f"DEBUG: Error saving questionnaire: {str(e)}")
+        logger.error("Error saving questionnaire: %s", e)
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/questionnaire/latest', methods=['GET'])
+@api.route('/api/questionnaire/latest', methods=['GET'])
 def get_questionnaire():
     try:
         user_id = request.args.get('userId')
-        print(f"DEBUG: Fetching questionnaire data for user {user_id}")
-        print(f"DEBUG: Available users: {list(questionnaire_data.keys())}")
-        
-        if user_id and user_id in questionnaire_data:
-            print(f"DEBUG: Found data for user {user_id}")
-            return jsonify(questionnaire_data[user_id])
-        print(f"DEBUG: No data found for user {user_id}")
+        record = session_store.get_questionnaire(user_id) if user_id else None
+        logger.debug("Questionnaire for user %s: %s", user_id, "found" if record else "not found")
+        if record is not None:
+            return jsonify(record)
         return jsonify({'error': 'No questionnaire data found'}), 404
     except Exception as e:
-        print(f"DEBUG: Error fetching questionnaire: {str(e)}")
+        logger.error("Error fetching questionnaire: %s", e)
         return jsonify({'error': str(e)}), 500
 
 def get_questionnaire_context(user_id):
-    print(f"DEBUG: Getting questionnaire context for user {user_id}")
-    print(f"DEBUG: Available users: {list(questionnaire_data.keys())}")
-    
-    if user_id and user_id in questionnaire_data:
-        data = questionnaire_data[user_id]
-        responses = data.get('responses', {})
-        print(f"DEBUG: Found questionnaire data with {len(responses)} responses")
-        
-        context_parts = []
-        phq_responses = {k: v for k, v in responses.items() if k.startswith('phq')}
-        if phq_responses:
-            avg_phq = sum(phq_responses.values()) / len(phq_responses) if phq_responses else 0
-            if avg_phq >= 2:
-                context_parts.append(f"Depression concerns (PHQ: {avg_phq:.1f}/3)")
-        
-        ghq_responses = {k: v for k, v in responses.items() if k.startswith('ghq')}
-        if ghq_responses:
-            avg_ghq = sum(ghq_responses.values()) / len(ghq_responses) if ghq_responses else 0
-            if avg_ghq >= 2:
-                context_parts.append(f"Anxiety concerns (GHQ: {avg_ghq:.1f}/3)")
-        
-        pss_responses = {k: v for k, v in responses.items() if k.startswith('pss')}
-        if pss_responses:
-            avg_pss = sum(pss_responses.values()) / len(pss_responses) if pss_responses else 0
-            if avg_pss >= 2:
-                context_parts.append(f"Stress concerns (PSS: {avg_pss:.1f}/3)")
-        
-        ucla_responses = {k: v for k, v in responses.items() if k.startswith('ucla')}
-        if ucla_responses:
-            avg_ucla = sum(ucla_responses.values()) / len(ucla_responses) if ucla_responses else 0
-            if avg_ucla >= 3:
-                context_parts.append(f"Social isolation concerns (UCLA: {avg_ucla:.1f}/4)")
-        
-        fin_responses = {k: v for k, v in responses.items() if k.startswith('fin')}
-        if fin_responses:
-            avg_fin = sum(fin_responses.values()) / len(fin_responses) if fin_responses else 0
-            if avg_fin >= 3:
-                context_parts.append(f"Financial stress concerns (Score: {avg_fin:.1f}/4)")
-        
-        acad_responses = {k: v for k, v in responses.items() if k.startswith('acad')}
-        if acad_responses:
-            avg_acad = sum(acad_responses.values()) / len(acad_responses) if acad_responses else 0
-            if avg_acad <= 2:
-                context_parts.append(f"Low academic motivation (Score: {avg_acad:.1f}/4)")
-        
-        return " | ".join(context_parts) if context_parts else "No significant concerns identified"
-    
-    return ""
+    """Context string precomputed when the questionnaire was saved"""
+    data = session_store.get_questionnaire(user_id) if user_id else None
+    if data is None:
+        return ""
+    if 'context' not in data:
+        # Saved before scoring moved to submission time
+        _, data['context'] = score_submission(data.get('responses', {}))
+    return data['context']
+
+@api.route('/api/questionnaire/cohort', methods=['GET'])
+def questionnaire_cohort():
+    """Cohort scoring over every stored questionnaire; `format=csv` exports per-user averages"""
+    records = session_store.questionnaires()
+    cohort = score_cohort({
+        user_id: record.get('responses', {}) for user_id, record in records.items()
+    })
+    averages, flags = cohort['averages'], cohort['flags']
 
-@app.route('/api/health', methods=['GET'])
+    if request.args.get('format') == 'csv':
+        rows = [",".join(['user_id'] + cohort['scales'])]
+        for user_id, row in zip(cohort['user_ids'], averages):
+            rows.append(",".join([str(user_id)] + ["" if np.isnan(v) else f"{v:.3f}" for v in row]))
+        return Response("\n".join(rows) + "\n", mimetype='text/csv')
+
+    answered = ~np.isnan(averages)
+    counts = answered.sum(axis=0)
+    totals = np.where(answered, averages, 0.0).sum(axis=0)
+    return jsonify({
+        'users': len(cohort['user_ids']),
+        'scales': {
+            key: {
+                'answered': int(counts[i]),
+                'flagged': int(flags[:, i].sum()),
+                'mean': float(totals[i] / counts[i]) if counts[i] else None
+            }
+            for i, key in enumerate(cohort['scales'])
+        }
+    })
+
+@api.route('/api/health', methods=['GET'])
 def health():
     return jsonify({'status': 'ok'})
 
-@app.route('/api/questionnaire/debug', methods=['GET'])
+@api.route('/api/ready', methods=['GET'])
+def ready():
+    """Readiness for load balancers: model client and knowledge base warmed, not draining"""
+    is_ready = (
+        readiness['model']
+        and readiness['knowledge_base'] is not False
+        and not readiness['shutting_down']
+    )
+    return jsonify({'ready': is_ready, **readiness}), 200 if is_ready else 503
+
+@api.route('/api/sessions/stats', methods=['GET'])
+def session_stats():
+    return jsonify(session_store.stats())
+
+@api.route('/api/cache/stats', methods=['GET'])
+def cache_stats():
+    return jsonify(response_cache.stats())
+
+@api.route('/api/embeddings/stats', methods=['GET'])
+def embeddings_stats():
+    if knowledge_base is None:
+        return jsonify({'error': 'Knowledge base is not loaded'}), 503
+    return jsonify(knowledge_base.embedding_service.stats())
+
+@api.route('/api/history/stats', methods=['GET'])
+def history_stats():
+    return jsonify(history_manager.stats())
+
+@api.route('/api/scheduler/stats', methods=['GET'])
+def scheduler_stats():
+    return jsonify(scheduler.stats())
+
+@api.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+
+@api.after_request
+def record_request(response):
+    endpoint = request.endpoint or 'unknown'
+    telemetry.inc('requests_total', endpoint=endpoint, status=response.status_code)
+    # Streamed responses are timed to the first byte; the stream itself shows up as reply_stream
+    telemetry.observe('request_seconds', time.perf_counter() - g.request_start, endpoint=endpoint)
+    return response
+
+@api.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    return Response(telemetry.registry.render(), mimetype='text/plain; version=0.0.4')
+
+@api.route('/api/debug/profile', methods=['GET'])
+def profile():
+    """Sample every thread's stack for `seconds` and return collapsed stacks for a flame graph"""
+    if not PROFILING_ENABLED:
+        return jsonify({'error': 'Profiling is disabled (set PROFILING_ENABLED=1)'}), 404
+    seconds = min(max(request.args.get('seconds', 5, type=float), 0.1), 60)
+    try:
+        stacks = profiler.profile(seconds)
+    except RuntimeError as e:
+        return jsonify({'error': str(e)}), 409
+    return Response(stacks, mimetype='text/plain')
+
+@api.route('/api/questionnaire/debug', methods=['GET'])
 def debug_questionnaire():
+    questionnaire_data = session_store.questionnaires()
     return jsonify({
         'total_users': len(questionnaire_data),
         'user_ids': list(questionnaire_data.keys()),
@@ -256,4 +765,4 @@ def debug_questionnaire():
     })
 
 if __name__ == '__main__':
-    app.run(debug=True, port=5000)
\ No newline at end of file
+    create_app().run(debug=True, port=5000)
\ No newline at end of file
@@ -0,0 +1,541 @@
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+from bisect import insort
+from collections import OrderedDict
+
+from aggregates import empty_aggregate, summarize, update_aggregate, window
+
+
+def new_session():
+    return {
+        # {'seq', 'role', 'text'} dicts; seq keeps counting after old messages are trimmed
+        'history': [],
+        'messages': 0,
+        'summary': "",
+        'summary_through': 0,
+        'metrics_history': [],
+        # Incremented for every metrics record, so pollers can page in arrival order
+        'metrics_seq': 0,
+        'turns': 0,
+        'pending_metrics': 0,
+        'aggregate': empty_aggregate()
+    }
+
+def estimate_size(value):
+    """Rough byte count for a session entry, cheap enough to run on every write"""
+    if isinstance(value, str):
+        return sys.getsizeof(value)
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(estimate_size(v) for v in value.values())
+    if isinstance(value, (list, tuple)):
+        return sys.getsizeof(value) + sum(estimate_size(v) for v in value)
+    return sys.getsizeof(value)
+
+
+class InMemorySessionStore:
+    """LRU + idle-TTL session store with a per-session history cap"""
+
+    def __init__(self, max_sessions=10000, idle_ttl=24 * 3600, max_history=50,
+                 max_questionnaires=10000, questionnaire_ttl=30 * 24 * 3600):
+        self.max_sessions = max_sessions
+        self.idle_ttl = idle_ttl
+        self.max_history = max_history
+        self.max_questionnaires = max_questionnaires
+        self.questionnaire_ttl = questionnaire_ttl
+
+        self._sessions = OrderedDict()
+        self._questionnaires = OrderedDict()
+        self._lock = threading.Lock()
+        self._bytes = 0
+        self._counters = {
+            'evicted_lru': 0,
+            'evicted_idle': 0,
+            'trimmed_entries': 0
+        }
+
+    def _expire(self, entries, ttl, now):
+        # Entries are kept in access order, so expired ones are always at the front
+        evicted = 0
+        while entries:
+            key, entry = next(iter(entries.items()))
+            if now - entry['last_access'] < ttl:
+                break
+            entries.popitem(last=False)
+            self._bytes -= entry['bytes']
+            evicted += 1
+        self._counters['evicted_idle'] += evicted
+
+    def _touch(self, entries, key, now):
+        entry = entries.get(key)
+        if entry is not None:
+            entry['last_access'] = now
+            entries.move_to_end(key)
+        return entry
+
+    def _evict_overflow(self, entries, limit):
+        while len(entries) > limit:
+            _, entry = entries.popitem(last=False)
+            self._bytes -= entry['bytes']
+            self._counters['evicted_lru'] += 1
+
+    def _trim(self, entry, key):
+        items = entry['session'][key]
+        while len(items) > self.max_history:
+            removed = items.pop(0)
+            size = estimate_size(removed)
+            entry['bytes'] -= size
+            self._bytes -= size
+            self._counters['trimmed_entries'] += 1
+
+    def _add_bytes(self, entry, size):
+        entry['bytes'] += size
+        self._bytes += size
+
+    def _snapshot(self, session):
+        return {
+            'history': list(session['history']),
+            'metrics_history': list(session['metrics_history']),
+            'summary': session['summary'],
+            'summary_through': session['summary_through'],
+            'turns': session['turns'],
+            'pending_metrics': session['pending_metrics']
+        }
+
+    def start_turn(self, session_id):
+        """Create the session if needed and reserve the next turn number"""
+        now = time.time()
+        with self._lock:
+            self._expire(self._sessions, self.idle_ttl, now)
+            entry = self._touch(self._sessions, session_id, now)
+            if entry is None:
+                session = new_session()
+                entry = {'session': session, 'last_access': now, 'bytes': 0}
+                self._sessions[session_id] = entry
+                self._add_bytes(entry, estimate_size(session))
+                self._evict_overflow(self._sessions, self.max_sessions)
+
+            session = entry['session']
+            turn = session['turns']
+            session['turns'] += 1
+            session['pending_metrics'] += 1
+            return self._snapshot(session), turn
+
+    def get(self, session_id):
+        now = time.time()
+        with self._lock:
+            self._expire(self._sessions, self.idle_ttl, now)
+            entry = self._touch(self._sessions, session_id, now)
+            return self._snapshot(entry['session']) if entry else None
+
+    def append_exchange(self, session_id, user_message, bot_response):
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            if entry is None:
+                return
+            session = entry['session']
+            messages = [
+                {'seq': session['messages'] + 1, 'role': 'user', 'text': user_message},
+                {'seq': session['messages'] + 2, 'role': 'bot', 'text': bot_response}
+            ]
+            session['messages'] += 2
+            session['history'].extend(messages)
+            self._add_bytes(entry, estimate_size(messages))
+            self._trim(entry, 'history')
+
+    def save_summary(self, session_id, summary, through):
+        """Store a rolling summary of every message up to seq `through`"""
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            if entry is None or through <= entry['session']['summary_through']:
+                return
+            session = entry['session']
+            self._add_bytes(entry, estimate_size(summary) - estimate_size(session['summary']))
+            session['summary'] = summary
+            session['summary_through'] = through
+
+    def append_metrics(self, session_id, record):
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            if entry is None:
+                return
+            session = entry['session']
+            session['metrics_seq'] += 1
+            record = {**record, 'seq': session['metrics_seq']}
+            insort(session['metrics_history'], record, key=lambda m: m['timestamp'])
+            session['pending_metrics'] = max(session['pending_metrics'] - 1, 0)
+            update_aggregate(session['aggregate'], record['timestamp'], record['metrics'])
+            self._add_bytes(entry, estimate_size(record))
+            self._trim(entry, 'metrics_history')
+
+    def get_metrics(self, session_id, since=None, limit=None):
+        """Running aggregates plus a window of the metrics history"""
+        now = time.time()
+        with self._lock:
+            self._expire(self._sessions, self.idle_ttl, now)
+            entry = self._touch(self._sessions, session_id, now)
+            if entry is None:
+                return None
+            session = entry['session']
+            return {
+                **summarize(session['aggregate']),
+                'history': window(session['metrics_history'], since, limit),
+                'pending': session['pending_metrics']
+            }
+
+    def save_questionnaire(self, user_id, record):
+        now = time.time()
+        with self._lock:
+            self._expire(self._questionnaires, self.questionnaire_ttl, now)
+            previous = self._questionnaires.pop(user_id, None)
+            if previous is not None:
+                self._bytes -= previous['bytes']
+            entry = {'session': record, 'last_access': now, 'bytes': estimate_size(record)}
+            self._bytes += entry['bytes']
+            self._questionnaires[user_id] = entry
+            self._evict_overflow(self._questionnaires, self.max_questionnaires)
+
+    def get_questionnaire(self, user_id):
+        now = time.time()
+        with self._lock:
+            self._expire(self._questionnaires, self.questionnaire_ttl, now)
+            entry = self._touch(self._questionnaires, user_id, now)
+            return entry['session'] if entry else None
+
+    def questionnaires(self):
+        with self._lock:
+            return {user_id: entry['session'] for user_id, entry in self._questionnaires.items()}
+
+    def stats(self):
+        with self._lock:
+            return {
+                'backend': 'memory',
+                'sessions': len(self._sessions),
+                'questionnaires': len(self._questionnaires),
+                'approx_bytes': self._bytes,
+                'max_sessions': self.max_sessions,
+                'max_history': self.max_history,
+                'idle_ttl_seconds': self.idle_ttl,
+                **self._counters
+            }
+
+
+class SQLiteSessionStore:
+    """Persistent store so sessions survive restarts and are shared between workers"""
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS sessions (
+        session_id TEXT PRIMARY KEY,
+        turns INTEGER NOT NULL DEFAULT 0,
+        pending_metrics INTEGER NOT NULL DEFAULT 0,
+        last_access REAL NOT NULL,
+        aggregate TEXT,
+        summary TEXT,
+        summary_through INTEGER NOT NULL DEFAULT 0,
+        metrics_seq INTEGER NOT NULL DEFAULT 0
+    );
+    CREATE INDEX IF NOT EXISTS sessions_last_access ON sessions(last_access);
+    CREATE TABLE IF NOT EXISTS messages (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        session_id TEXT NOT NULL,
+        role TEXT NOT NULL,
+        text TEXT NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS messages_session ON messages(session_id, id);
+    CREATE TABLE IF NOT EXISTS metrics (
+        session_id TEXT NOT NULL,
+        turn INTEGER NOT NULL,
+        metrics TEXT NOT NULL,
+        message TEXT NOT NULL,
+        seq INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (session_id, turn)
+    );
+    CREATE TABLE IF NOT EXISTS questionnaires (
+        user_id TEXT PRIMARY KEY,
+        record TEXT NOT NULL,
+        last_access REAL NOT NULL
+    );
+    """
+
+    PRUNE_INTERVAL = 60
+
+    def __init__(self, path="sessions.db", max_sessions=100000, idle_ttl=24 * 3600,
+                 max_history=50, questionnaire_ttl=30 * 24 * 3600):
+        self.path = path
+        self.max_sessions = max_sessions
+        self.idle_ttl = idle_ttl
+        self.max_history = max_history
+        self.questionnaire_ttl = questionnaire_ttl
+        self._local = threading.local()
+        self._last_prune = 0
+        self._counters = {'evicted_lru': 0, 'evicted_idle': 0}
+        conn = self._conn()
+        conn.executescript(self.SCHEMA)
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(sessions)")}
+        if 'aggregate' not in columns:
+            conn.execute("ALTER TABLE sessions ADD COLUMN aggregate TEXT")
+        if 'summary' not in columns:
+            conn.execute("ALTER TABLE sessions ADD COLUMN summary TEXT")
+            conn.execute("ALTER TABLE sessions ADD COLUMN summary_through INTEGER NOT NULL DEFAULT 0")
+        if 'metrics_seq' not in columns:
+            # Older databases paged on the turn number; carry that over as the first sequence
+            conn.execute("ALTER TABLE sessions ADD COLUMN metrics_seq INTEGER NOT NULL DEFAULT 0")
+            conn.execute("ALTER TABLE metrics ADD COLUMN seq INTEGER NOT NULL DEFAULT 0")
+            conn.execute("UPDATE metrics SET seq = turn")
+            conn.execute(
+                "UPDATE sessions SET metrics_seq = "
+                "(SELECT COALESCE(MAX(turn), 0) FROM metrics WHERE metrics.session_id = sessions.session_id)"
+            )
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _transaction(self):
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        return conn
+
+    def _load(self, conn, session_id, row):
+        history = [
+            {'seq': seq, 'role': role, 'text': text}
+            for seq, role, text in conn.execute(
+                "SELECT id, role, text FROM (SELECT id, role, text FROM messages WHERE session_id = ? "
+                "ORDER BY id DESC LIMIT ?) ORDER BY id",
+                (session_id, self.max_history)
+            )
+        ]
+        metrics_history = [
+            {'timestamp': turn, 'metrics': json.loads(metrics), 'message': message, 'seq': seq}
+            for turn, metrics, message, seq in conn.execute(
+                "SELECT turn, metrics, message, seq FROM (SELECT * FROM metrics WHERE session_id = ? "
+                "ORDER BY turn DESC LIMIT ?) ORDER BY turn",
+                (session_id, self.max_history)
+            )
+        ]
+        return {
+            'history': history,
+            'metrics_history': metrics_history,
+            'summary': row[2] or "",
+            'summary_through': row[3],
+            'turns': row[0],
+            'pending_metrics': row[1]
+        }
+
+    def _maybe_prune(self, now):
+        if now - self._last_prune < self.PRUNE_INTERVAL:
+            return
+        self._last_prune = now
+        conn = self._transaction()
+        try:
+            cutoff = now - self.idle_ttl
+            stale = "SELECT session_id FROM sessions WHERE last_access < ?"
+            conn.execute(f"DELETE FROM messages WHERE session_id IN ({stale})", (cutoff,))
+            conn.execute(f"DELETE FROM metrics WHERE session_id IN ({stale})", (cutoff,))
+            idle = conn.execute("DELETE FROM sessions WHERE last_access < ?", (cutoff,)).rowcount
+
+            overflow = (
+                "SELECT session_id FROM sessions ORDER BY last_access DESC LIMIT -1 OFFSET ?"
+            )
+            conn.execute(f"DELETE FROM messages WHERE session_id IN ({overflow})", (self.max_sessions,))
+            conn.execute(f"DELETE FROM metrics WHERE session_id IN ({overflow})", (self.max_sessions,))
+            lru = conn.execute(
+                f"DELETE FROM sessions WHERE session_id IN ({overflow})", (self.max_sessions,)
+            ).rowcount
+
+            conn.execute(
+                "DELETE FROM questionnaires WHERE last_access < ?", (now - self.questionnaire_ttl,)
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        self._counters['evicted_idle'] += idle
+        self._counters['evicted_lru'] += lru
+
+    def start_turn(self, session_id):
+        now = time.time()
+        self._maybe_prune(now)
+        conn = self._transaction()
+        try:
+            conn.execute(
+                "INSERT INTO sessions (session_id, last_access) VALUES (?, ?) "
+                "ON CONFLICT(session_id) DO NOTHING",
+                (session_id, now)
+            )
+            conn.execute(
+                "UPDATE sessions SET turns = turns + 1, pending_metrics = pending_metrics + 1, "
+                "last_access = ? WHERE session_id = ?",
+                (now, session_id)
+            )
+            row = conn.execute(
+                "SELECT turns, pending_metrics, summary, summary_through FROM sessions "
+                "WHERE session_id = ?",
+                (session_id,)
+            ).fetchone()
+            session = self._load(conn, session_id, row)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return session, session['turns'] - 1
+
+    def get(self, session_id):
+        conn = self._conn()
+        row = conn.execute(
+            "SELECT turns, pending_metrics, summary, summary_through FROM sessions WHERE session_id = ?",
+            (session_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        conn.execute("UPDATE sessions SET last_access = ? WHERE session_id = ?", (time.time(), session_id))
+        return self._load(conn, session_id, row)
+
+    def append_exchange(self, session_id, user_message, bot_response):
+        conn = self._transaction()
+        try:
+            conn.executemany(
+                "INSERT INTO messages (session_id, role, text) VALUES (?, ?, ?)",
+                [(session_id, 'user', user_message), (session_id, 'bot', bot_response)]
+            )
+            conn.execute(
+                "DELETE FROM messages WHERE session_id = ? AND id NOT IN "
+                "(SELECT id FROM messages WHERE session_id = ? ORDER BY id DESC LIMIT ?)",
+                (session_id, session_id, self.max_history)
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def save_summary(self, session_id, summary, through):
+        self._conn().execute(
+            "UPDATE sessions SET summary = ?, summary_through = ? "
+            "WHERE session_id = ? AND summary_through < ?",
+            (summary, through, session_id, through)
+        )
+
+    def append_metrics(self, session_id, record):
+        conn = self._transaction()
+        try:
+            row = conn.execute(
+                "SELECT aggregate, metrics_seq FROM sessions WHERE session_id = ?", (session_id,)
+            ).fetchone()
+            seq = (row[1] if row else 0) + 1
+            conn.execute(
+                "INSERT OR REPLACE INTO metrics (session_id, turn, metrics, message, seq) VALUES (?, ?, ?, ?, ?)",
+                (session_id, record['timestamp'], json.dumps(record['metrics']), record['message'], seq)
+            )
+            aggregate = json.loads(row[0]) if row and row[0] else empty_aggregate()
+            update_aggregate(aggregate, record['timestamp'], record['metrics'])
+            conn.execute(
+                "UPDATE sessions SET pending_metrics = MAX(pending_metrics - 1, 0), aggregate = ?, "
+                "metrics_seq = ? WHERE session_id = ?",
+                (json.dumps(aggregate), seq, session_id)
+            )
+            conn.execute(
+                "DELETE FROM metrics WHERE session_id = ? AND turn NOT IN "
+                "(SELECT turn FROM metrics WHERE session_id = ? ORDER BY turn DESC LIMIT ?)",
+                (session_id, session_id, self.max_history)
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def get_metrics(self, session_id, since=None, limit=None):
+        conn = self._conn()
+        row = conn.execute(
+            "SELECT pending_metrics, aggregate FROM sessions WHERE session_id = ?", (session_id,)
+        ).fetchone()
+        if row is None:
+            return None
+
+        if since is not None:
+            rows = conn.execute(
+                "SELECT turn, metrics, message, seq FROM metrics WHERE session_id = ? AND seq > ? "
+                "ORDER BY seq LIMIT ?",
+                (session_id, since, -1 if limit is None else limit)
+            ).fetchall()
+        else:
+            rows = conn.execute(
+                "SELECT turn, metrics, message, seq FROM metrics WHERE session_id = ? "
+                "ORDER BY turn DESC LIMIT ?",
+                (session_id, -1 if limit is None else limit)
+            ).fetchall()[::-1]
+
+        aggregate = json.loads(row[1]) if row[1] else empty_aggregate()
+        return {
+            **summarize(aggregate),
+            'history': [
+                {'timestamp': turn, 'metrics': json.loads(metrics), 'message': message, 'seq': seq}
+                for turn, metrics, message, seq in rows
+            ],
+            'pending': row[0]
+        }
+
+    def save_questionnaire(self, user_id, record):
+        self._conn().execute(
+            "INSERT OR REPLACE INTO questionnaires (user_id, record, last_access) VALUES (?, ?, ?)",
+            (str(user_id), json.dumps(record), time.time())
+        )
+
+    def get_questionnaire(self, user_id):
+        conn = self._conn()
+        row = conn.execute(
+            "SELECT record FROM questionnaires WHERE user_id = ?", (str(user_id),)
+        ).fetchone()
+        if row is None:
+            return None
+        conn.execute(
+            "UPDATE questionnaires SET last_access = ? WHERE user_id = ?", (time.time(), str(user_id))
+        )
+        return json.loads(row[0])
+
+    def questionnaires(self):
+        return {
+            user_id: json.loads(record)
+            for user_id, record in self._conn().execute("SELECT user_id, record FROM questionnaires")
+        }
+
+    def stats(self):
+        conn = self._conn()
+        count = lambda table: conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+        page_count = conn.execute("PRAGMA page_count").fetchone()[0]
+        page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+        return {
+            'backend': 'sqlite',
+            'path': self.path,
+            'sessions': count('sessions'),
+            'questionnaires': count('questionnaires'),
+            'messages': count('messages'),
+            'metrics_rows': count('metrics'),
+            'db_bytes': page_count * page_size,
+            'max_sessions': self.max_sessions,
+            'max_history': self.max_history,
+            'idle_ttl_seconds': self.idle_ttl,
+            **self._counters
+        }
+
+
+def create_session_store():
+    """Build the session store selected by SESSION_STORE (memory or sqlite)"""
+    backend = os.getenv("SESSION_STORE", "memory")
+    options = {
+        'max_sessions': int(os.getenv("SESSION_MAX", "10000")),
+        'idle_ttl': float(os.getenv("SESSION_IDLE_TTL", str(24 * 3600))),
+        'max_history': int(os.getenv("SESSION_MAX_HISTORY", "50"))
+    }
+    if backend == "sqlite":
+        return SQLiteSessionStore(path=os.getenv("SESSION_DB_PATH", "sessions.db"), **options)
+    if backend == "memory":
+        return InMemorySessionStore(**options)
+    raise ValueError(f"Unknown SESSION_STORE: {backend}")
@@ -0,0 +1,83 @@
+"""Parsing and validation of JSON model output, and the single-call reply + metrics prompt"""
+import json
+import re
+
+METRIC_KEYS = ["stress", "anxiety", "loneliness", "motivation", "financial_burden", "academic_pressure"]
+
+METRIC_GUIDE = """- stress (0=calm, 10=extremely stressed)
+- anxiety (0=relaxed, 10=severe anxiety)
+- loneliness (0=socially fulfilled, 10=extremely lonely)
+- motivation (0=no motivation, 10=highly motivated)
+- financial_burden (0=no concern, 10=severe financial stress)
+- academic_pressure (0=no pressure, 10=overwhelming pressure)"""
+
+# Passed to Gemini so the combined call comes back as bare JSON
+JSON_OUTPUT = {"response_mime_type": "application/json"}
+
+FENCE = re.compile(r'```(?:json)?\s*(.*?)```', re.DOTALL)
+
+
+def parse_json_block(text):
+    """Decode a JSON object from model output that may be fenced or wrapped in prose"""
+    text = (text or "").strip()
+    candidates = [text]
+    candidates += [block.strip() for block in FENCE.findall(text)]
+    start, end = text.find("{"), text.rfind("}")
+    if start != -1 and end > start:
+        candidates.append(text[start:end + 1])
+
+    for candidate in candidates:
+        try:
+            value = json.loads(candidate)
+        except ValueError:
+            continue
+        if isinstance(value, dict):
+            return value
+    raise ValueError("No JSON object in model output")
+
+def validate_metrics(metrics):
+    """Return the six metrics as ints in 0-10, repairing numeric strings and out-of-range values.
+
+    Raises ValueError when a metric is missing or not a number.
+    """
+    if not isinstance(metrics, dict):
+        raise ValueError("metrics must be an object")
+    cleaned = {}
+    for key in METRIC_KEYS:
+        value = metrics.get(key)
+        if isinstance(value, str):
+            try:
+                value = float(value.strip())
+            except ValueError:
+                pass
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            raise ValueError(f"metric '{key}' must be a number, got {value!r}")
+        cleaned[key] = int(round(min(max(value, 0), 10)))
+    return cleaned
+
+def validate_turn(value):
+    """Check a combined {"reply": ..., "metrics": {...}} object and return (reply, metrics)"""
+    reply = value.get("reply")
+    if not isinstance(reply, str) or not reply.strip():
+        raise ValueError("reply must be a non-empty string")
+    return reply.strip(), validate_metrics(value.get("metrics"))
+
+def build_combined_prompt(reply_prompt):
+    """Extend the reply prompt so one call returns the reply and the metrics together"""
+    return f"""{reply_prompt}
+
+Also rate the user's current state from the whole conversation on a scale of 0-10:
+{METRIC_GUIDE}
+
+Return ONLY a JSON object with exactly this shape:
+{{"reply": "<your reply to the user>", "metrics": {{"stress": 7, "anxiety": 6, "loneliness": 3, "motivation": 4, "financial_burden": 5, "academic_pressure": 8}}}}
+
+Combined JSON Response:"""
+
+def build_repair_prompt(combined_prompt, output, error):
+    return f"""{combined_prompt}
+{output}
+
+That output was rejected: {error}. Return the corrected JSON object only.
+
+Combined JSON Response:"""
@@ -0,0 +1,187 @@
+"""In-process counters, histograms and an optional stack-sampling profiler.
+
+Everything is exposed in the Prometheus text format by render(). Counters and histograms
+are per process, so under gunicorn each worker reports its own series.
+"""
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+from timing import StageTimer
+
+# Seconds; model calls dominate, so the upper buckets matter most
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+PREFIX = "mindly_"
+
+
+def format_labels(labels):
+    if not labels:
+        return ""
+    parts = []
+    for key, value in labels:
+        value = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        parts.append(f'{key}="{value}"')
+    return "{" + ",".join(parts) + "}"
+
+
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._help = {}
+        self._counters = {}    # name -> {label tuple: value}
+        self._histograms = {}  # name -> (buckets, {label tuple: [bucket counts, sum, count]})
+        self._collectors = []
+
+    def counter(self, name, help_text):
+        with self._lock:
+            self._help[name] = help_text
+            self._counters.setdefault(name, {})
+
+    def histogram(self, name, help_text, buckets=DEFAULT_BUCKETS):
+        with self._lock:
+            self._help[name] = help_text
+            self._histograms.setdefault(name, (tuple(buckets), {}))
+
+    def inc(self, name, amount=1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._counters[name]
+            series[key] = series.get(key, 0) + amount
+
+    def observe(self, name, value, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            buckets, series = self._histograms[name]
+            state = series.get(key)
+            if state is None:
+                state = series[key] = [[0] * len(buckets), 0.0, 0]
+            for i, bound in enumerate(buckets):
+                if value <= bound:
+                    state[0][i] += 1
+            state[1] += value
+            state[2] += 1
+
+    def register_collector(self, collect):
+        """`collect()` returns [(name, help, {label tuple or None: value})] gauges read at scrape time"""
+        with self._lock:
+            self._collectors.append(collect)
+
+    def render(self):
+        lines = []
+        with self._lock:
+            counters = {name: dict(series) for name, series in self._counters.items()}
+            histograms = {
+                name: (buckets, {k: [list(v[0]), v[1], v[2]] for k, v in series.items()})
+                for name, (buckets, series) in self._histograms.items()
+            }
+            help_texts = dict(self._help)
+            collectors = list(self._collectors)
+
+        for name, series in sorted(counters.items()):
+            lines.append(f"# HELP {PREFIX}{name} {help_texts[name]}")
+            lines.append(f"# TYPE {PREFIX}{name} counter")
+            for key, value in sorted(series.items()):
+                lines.append(f"{PREFIX}{name}{format_labels(key)} {value}")
+
+        for name, (buckets, series) in sorted(histograms.items()):
+            lines.append(f"# HELP {PREFIX}{name} {help_texts[name]}")
+            lines.append(f"# TYPE {PREFIX}{name} histogram")
+            for key, (counts, total, count) in sorted(series.items()):
+                for bound, bucket_count in zip(buckets, counts):
+                    lines.append(f"{PREFIX}{name}_bucket{format_labels(key + (('le', bound),))} {bucket_count}")
+                lines.append(f"{PREFIX}{name}_bucket{format_labels(key + (('le', '+Inf'),))} {count}")
+                lines.append(f"{PREFIX}{name}_sum{format_labels(key)} {total}")
+                lines.append(f"{PREFIX}{name}_count{format_labels(key)} {count}")
+
+        for collect in collectors:
+            try:
+                gauges = collect()
+            except Exception as e:
+                lines.append(f"# collector failed: {e}")
+                continue
+            for name, help_text, samples in gauges:
+                lines.append(f"# HELP {PREFIX}{name} {help_text}")
+                lines.append(f"# TYPE {PREFIX}{name} gauge")
+                for labels, value in samples.items():
+                    lines.append(f"{PREFIX}{name}{format_labels(labels or ())} {value}")
+
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+registry.counter("requests_total", "HTTP requests by endpoint and status code")
+registry.histogram("request_seconds", "HTTP request duration by endpoint")
+registry.histogram("stage_seconds", "Duration of each stage of request handling")
+registry.counter("fallbacks_total", "Degraded paths taken (timeouts, defaults, skipped retrieval)")
+registry.counter("model_errors_total", "Model calls that failed after retries, by call")
+
+inc = registry.inc
+observe = registry.observe
+
+
+@contextmanager
+def timed(stage):
+    """Record a stage that runs outside a request's StageTimer (e.g. on an executor thread)"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe("stage_seconds", time.perf_counter() - start, stage=stage)
+
+
+def stage_timer():
+    """A StageTimer whose stages also land in the stage_seconds histogram"""
+    return StageTimer(on_stage=lambda name, ms: observe("stage_seconds", ms / 1000, stage=name))
+
+
+def stats_collector(name, stats):
+    """Expose the numeric top-level fields of a component's stats() dict as gauges"""
+    def collect():
+        return [
+            (f"{name}_{key}", f"{name} stats field '{key}'", {None: value})
+            for key, value in stats().items()
+            if isinstance(value, (int, float)) and not isinstance(value, bool)
+        ]
+    return collect
+
+
+class StackSampler:
+    """Samples every thread's Python stack at a fixed interval.
+
+    Output is in collapsed-stack format ("outer;inner count" per line), which flame graph
+    tools read directly. Costs nothing unless a profile is running.
+    """
+
+    def __init__(self, interval=0.005, max_depth=64):
+        self.interval = interval
+        self.max_depth = max_depth
+        self._lock = threading.Lock()
+
+    def _collapse(self, frame):
+        names = []
+        while frame is not None and len(names) < self.max_depth:
+            code = frame.f_code
+            names.append(f"{code.co_name} ({os.path.basename(code.co_filename)})")
+            frame = frame.f_back
+        return ";".join(reversed(names))
+
+    def profile(self, seconds):
+        """Sample all threads for `seconds` and return collapsed stacks, busiest first"""
+        if not self._lock.acquire(blocking=False):
+            raise RuntimeError("A profile is already running")
+        try:
+            own = threading.get_ident()
+            stacks = Counter()
+            deadline = time.perf_counter() + seconds
+            while time.perf_counter() < deadline:
+                for thread_id, frame in sys._current_frames().items():
+                    if thread_id != own:
+                        stacks[self._collapse(frame)] += 1
+                time.sleep(self.interval)
+            return "\n".join(f"{stack} {count}" for stack, count in stacks.most_common())
+        finally:
+            self._lock.release()
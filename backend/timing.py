@@ -0,0 +1,27 @@
+import time
+from contextlib import contextmanager
+
+
+class StageTimer:
+    """Collects per-stage durations for one request and renders a Server-Timing header"""
+
+    def __init__(self, on_stage=None):
+        self.start = time.perf_counter()
+        self.stages = []
+        # Called with (name, milliseconds) as each stage ends, e.g. to feed a histogram
+        self.on_stage = on_stage
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            ms = (time.perf_counter() - start) * 1000
+            self.stages.append((name, ms))
+            if self.on_stage is not None:
+                self.on_stage(name, ms)
+
+    def header(self):
+        stages = self.stages + [('total', (time.perf_counter() - self.start) * 1000)]
+        return ", ".join(f"{name};dur={ms:.1f}" for name, ms in stages)
@@ -35,7 +35,7 @@ const getSessionId = () => {
   return sessionId
 }
 
-async function generateReply(message: string, sessionId: string, userId?: string): Promise<{response: string, metrics: Metrics}> {
+async function generateReply(message: string, sessionId: string, userId?: string): Promise<{response: string, metrics: Metrics | null}> {
   try {
     const response = await fetch('http://localhost:5000/api/chat', {
       method: 'POST',
@@ -64,10 +64,64 @@ async function generateReply(message: string, sessionId: string, userId?: string
   }
 }
 
+async function streamReply(
+  message: string,
+  sessionId: string,
+  userId: string | undefined,
+  onChunk: (text: string) => void,
+): Promise<{response: string, metrics: Metrics | null}> {
+  const response = await fetch('http://localhost:5000/api/chat/stream', {
+    method: 'POST',
+    headers: {
+      'Content-Type': 'application/json',
+    },
+    body: JSON.stringify({
+      message,
+      session_id: sessionId,
+      user_id: userId
+    }),
+  })
+
+  if (!response.ok || !response.body) {
+    throw new Error('Failed to get response')
+  }
+
+  const reader = response.body.getReader()
+  const decoder = new TextDecoder()
+  let buffer = ''
+  let text = ''
+  let metrics: Metrics | null = null
+
+  while (true) {
+    const { done, value } = await reader.read()
+    if (done) break
+    buffer += decoder.decode(value, { stream: true })
+
+    const events = buffer.split('\n\n')
+    buffer = events.pop() || ''
+    for (const raw of events) {
+      const event = raw.match(/^event: (.*)$/m)?.[1]
+      const data = raw.match(/^data: (.*)$/m)?.[1]
+      if (!event || !data) continue
+      const payload = JSON.parse(data)
+      if (event === 'chunk') {
+        text += payload.text
+        onChunk(text)
+      } else if (event === 'done') {
+        text = payload.response
+        metrics = payload.metrics
+      }
+    }
+  }
+
+  return { response: text, metrics }
+}
+
 export default function Chatbot() {
   const [log, setLog] = useState<Bubble[]>([])
   const [input, setInput] = useState('')
   const [loading, setLoading] = useState(false)
+  const [streaming, setStreaming] = useState(false)
   const [sessionId] = useState(getSessionId())
   const [currentMetrics, setCurrentMetrics] = useState<Metrics | null>(null)
   const [userId, setUserId] = useState<string | null>(null)
@@ -117,7 +171,7 @@ export default function Chatbot() {
           userId
         )
         setLog(l => [...l, { role: 'bot', text: reply }])
-        setCurrentMetrics(metrics)
+        if (metrics) setCurrentMetrics(metrics)
       } else {
         console.error('Failed to fetch questionnaire data:', questionnaireResult.error)
         setLog([{ role: 'bot', text: "Hey! I'm Mindly. How can I support you today? 😊" }])
@@ -186,9 +240,24 @@ export default function Chatbot() {
     setInput('')
     setLoading(true)
     
-    const { response: reply, metrics } = await generateReply(text, sessionId, userId || undefined)
-    setLog(l => [...l, { role: 'bot', text: reply }])
-    setCurrentMetrics(metrics)
+    const showPartial = (partial: string) => {
+      setStreaming(true)
+      setLog(l => l[l.length - 1]?.role === 'bot'
+        ? [...l.slice(0, -1), { role: 'bot', text: partial }]
+        : [...l, { role: 'bot', text: partial }])
+    }
+
+    try {
+      const { response: reply, metrics } = await streamReply(text, sessionId, userId || undefined, showPartial)
+      showPartial(reply)
+      if (metrics) setCurrentMetrics(metrics)
+    } catch (error) {
+      console.error('Streaming failed, falling back:', error)
+      const { response: reply, metrics } = await generateReply(text, sessionId, userId || undefined)
+      showPartial(reply)
+      if (metrics) setCurrentMetrics(metrics)
+    }
+    setStreaming(false)
     setLoading(false)
   }
 
@@ -218,7 +287,7 @@ export default function Chatbot() {
                 )}
               </div>
             ))}
-            {loading && <div className="bubble bot">Thinking... 💭</div>}
+            {loading && !streaming && <div className="bubble bot">Thinking... 💭</div>}
           </div>
           <form onSubmit={onSubmit} className="flex gap-2">
             <input 
@@ -265,4 +334,4 @@ export default function Chatbot() {
       </section>
     </div>
   )
-}
\ No newline at end of file
+}
\ No newline at end of file